@@ -6,11 +6,13 @@
 # License           : BSD License
 # -----------------------------------------------------------------------------
 # Creation date     : 2016-11-25
-# Last modification : 2016-12-21
+# Last modification : 2026-10-19
 # -----------------------------------------------------------------------------
 
 from __future__ import print_function
-from .core import Tracker, Resolver, PARSERS, find, list, provides
+from .core import Tracker, Resolver, Workspace, Symbol, ParserPool, FileSystem, VirtualFileSystem, DictFileSystem, ArchiveFileSystem, OverlayFileSystem, LRUCache, IgnoreRules, DirectoryCache, NegativeCache, ResolutionCache, ParseCache, ResolveTrace, NodeModules, Digests, Closures, PARSERS, workspace, find, list, closures, newer, iterload, iteredges, provides
+from .profiling import Profile
+from .scheduler import Scheduler
 from .main import process
 
 __version__ = "0.3.1"
@@ -5,17 +5,21 @@
 # License           : BSD License
 # -----------------------------------------------------------------------------
 # Creation date     : 2016-11-25
-# Last modification : 2019-02-14
+# Last modification : 2026-10-19
 # -----------------------------------------------------------------------------
 
 from __future__ import print_function
 
-import sys, os, re, glob, argparse, fnmatch
-from   functools import reduce
+import sys, os, io, re, glob, json, time, hashlib, argparse, fnmatch, threading
+from   functools   import reduce
+from   contextlib  import contextmanager
+from   collections import OrderedDict, deque
+from   types       import MappingProxyType
 
-# TODO: Using tuples instead of proper data types was a big arhcitectural
+# NOTE: Using tuples instead of proper data types was a big arhcitectural
 # mistake. It makes it very hard to enforce type safetype and understand 
-# what type of value we're dealing with.
+# what type of value we're dealing with. Symbols are now `Symbol` instances,
+# which are interned and remain tuple-compatible for existing code.
 
 # TODO: We should introduce a high-level tracker/resolver (maybe as
 # catalogue) that does caching. It should basically maintain
@@ -46,6 +50,1050 @@ Tracker are listed as couples `(<type>, <name>)` where type is a string like
 The `deparse` module features both an API and a command-line interface.
 """
 
+# -----------------------------------------------------------------------------
+#
+# SYMBOLS
+#
+# -----------------------------------------------------------------------------
+
+class Symbol(tuple):
+	"""A `(type, name)` symbol, as required or provided by parsed files.
+
+	Symbols are interned: the same `(type, name)` gives the same instance,
+	so the symbols shared by many files are only stored once. Symbols are
+	tuples (with no per-instance dictionary), so they can be unpacked,
+	compared and hashed like the plain `(type, name)` tuples they replace,
+	and plain tuples can still be used to look them up in dictionaries.
+
+	The registry holds at most `LIMIT` symbols, evicting the least recently
+	used ones, so that it stays bounded in long-lived processes (see
+	`Workspace`). Tuples cannot be weakly referenced, which rules out a
+	weak registry. An evicted symbol is still equal to the new instance
+	created for the same `(type, name)`, so interning stays invisible to
+	the code using symbols. The registry can be used from any thread."""
+
+	__slots__ = ()
+	LIMIT     = 100000
+	ALL       = OrderedDict()
+	LOCK      = threading.Lock()
+
+	def __new__( cls, type, name ):
+		key = (type, name)
+		with cls.LOCK:
+			symbol = cls.ALL.get(key)
+			if symbol is None:
+				if isinstance(type, str): type = sys.intern(type)
+				symbol = cls.ALL[key] = tuple.__new__(cls, (type, name))
+				while len(cls.ALL) > cls.LIMIT:
+					cls.ALL.popitem(last=False)
+			else:
+				cls.ALL.move_to_end(key)
+			return symbol
+
+	@classmethod
+	def Get( cls, item ):
+		"""Returns the interned symbol for the given `(type, name)` item."""
+		return item if isinstance(item, Symbol) else cls(item[0], item[1])
+
+	def __getnewargs__( self ):
+		return (self[0], self[1])
+
+	def __copy__( self ):
+		return self
+
+	def __deepcopy__( self, memo ):
+		return self
+
+	@property
+	def type( self ):
+		return self[0]
+
+	@property
+	def name( self ):
+		return self[1]
+
+# -----------------------------------------------------------------------------
+#
+# FILESYSTEMS
+#
+# -----------------------------------------------------------------------------
+
+class Stat(object):
+	"""The subset of `os.stat_result` used by deparse."""
+
+	__slots__ = ("st_mtime_ns", "st_size")
+
+	def __init__( self, mtime, size ):
+		self.st_mtime_ns = mtime
+		self.st_size     = size
+
+class FileSystem(object):
+	"""The filesystem the files are read from, which is the local
+	filesystem by default (see `FILESYSTEM`). All the file accesses go
+	through the `DirectoryCache.fs` (or `FILESYSTEM` for the parsers that
+	don't have a cache), so that subclasses (see `VirtualFileSystem`)
+	can serve the files from memory, archives or git revisions."""
+
+	def list( self, path ):
+		"""Returns a map of `name → kind` for the directory at the given
+		absolute path, where kind is `d` for directories, `f` for anything
+		else and `None` for broken symlinks. Returns an empty map if the
+		path is not a directory."""
+		names = {}
+		try:
+			with os.scandir(path) as entries:
+				for e in entries:
+					if e.is_dir():
+						names[e.name] = "d"
+					elif e.is_symlink() and not os.path.exists(e.path):
+						names[e.name] = None
+					else:
+						names[e.name] = "f"
+		except OSError:
+			pass
+		return names
+
+	def read( self, path ):
+		"""Returns the content of the file at the given path as bytes,
+		raising an `IOError` if it cannot be read."""
+		with open(path, "rb") as f:
+			return f.read()
+
+	def stat( self, path ):
+		"""Returns the `os.stat` of the given path, or `None`."""
+		try:
+			return os.stat(path)
+		except OSError:
+			return None
+
+	def mtime( self, path ):
+		stat = self.stat(path)
+		return stat.st_mtime_ns if stat else None
+
+	def identity( self, path ):
+		"""Returns a key that is the same for all the spellings of the
+		given path (relative, absolute or through symlinks), which is the
+		file's `(st_dev, st_ino)`, or its real path if it has no inode."""
+		try:
+			stat = os.stat(path)
+		except OSError:
+			stat = None
+		if stat and stat.st_ino:
+			return (stat.st_dev, stat.st_ino)
+		return os.path.realpath(path)
+
+	def close( self ):
+		pass
+
+class VirtualFileSystem(FileSystem):
+	"""A read-only filesystem where the files are registered with `add`,
+	relative to a `root` directory (the current directory by default),
+	which is where the files appear to be: `root/a/b.js` is the file
+	added as `a/b.js`.
+
+	The content of a file is given by `loader(path, source)` if a loader is
+	given, and is its `source` otherwise, so that files can be added with
+	their content as bytes. Subclasses can also override `load`."""
+
+	def __init__( self, root=None, loader=None ):
+		self.root   = os.path.abspath(root or os.getcwd())
+		self.loader = loader
+		self.dirs   = {"":{}}
+		self.files  = {}
+
+	def add( self, path, size=0, source=None ):
+		"""Registers the file at the given relative path, where `source` is
+		what `load` needs to read it. Intermediate directories are created."""
+		parts = [_ for _ in path.replace("\\", "/").split("/") if _ and _ != "."]
+		if not parts:
+			return self
+		parent = ""
+		for name in parts[:-1]:
+			self.dirs[parent].setdefault(name, "d")
+			parent = parent + "/" + name if parent else name
+			self.dirs.setdefault(parent, {})
+		self.dirs[parent][parts[-1]] = "f"
+		self.files["/".join(parts)] = (size, source)
+		return self
+
+	def load( self, path, source ):
+		"""Returns the content of the file at the given relative path
+		as bytes."""
+		if self.loader:
+			return self.loader(path, source)
+		elif isinstance(source, bytes):
+			return source
+		elif source is None:
+			raise IOError("No content for file in {0}: {1}".format(self.__class__.__name__, path))
+		else:
+			return source.encode("utf8")
+
+	def relpath( self, path ):
+		"""Returns the path relative to the `root` with `/` separators,
+		or `None` if the path is outside the root."""
+		path = os.path.relpath(os.path.abspath(path), self.root)
+		if path == os.curdir:
+			return ""
+		return None if path.startswith(os.pardir) else path.replace(os.sep, "/")
+
+	def list( self, path ):
+		return self.dirs.get(self.relpath(path)) or {}
+
+	def identity( self, path ):
+		return os.path.normpath(os.path.abspath(path))
+
+	def read( self, path ):
+		rel = self.relpath(path)
+		if rel not in self.files:
+			raise IOError("No such file in {0}: {1}".format(self.__class__.__name__, path))
+		return self.load(rel, self.files[rel][1])
+
+	def stat( self, path ):
+		rel = self.relpath(path)
+		if rel in self.files:
+			return Stat(0, self.files[rel][0])
+		elif rel in self.dirs:
+			return Stat(0, 0)
+		else:
+			return None
+
+class DictFileSystem(VirtualFileSystem):
+	"""A filesystem of `{path:content}` where content is text or bytes."""
+
+	def __init__( self, files=None, root=None ):
+		super(DictFileSystem, self).__init__(root)
+		for path, content in (files or {}).items():
+			self.set(path, content)
+
+	def set( self, path, content ):
+		if not isinstance(content, bytes):
+			content = content.encode("utf8")
+		path = os.path.abspath(os.path.join(self.root, path))
+		return self.add(self.relpath(path), len(content), content)
+
+class ArchiveFileSystem(VirtualFileSystem):
+	"""A filesystem that reads the files of a tar (optionally compressed)
+	or zip archive without extracting it. Like `tar --strip-components`,
+	`strip` leading directories are removed from the member paths."""
+
+	def __init__( self, path, root=None, strip=0 ):
+		super(ArchiveFileSystem, self).__init__(root)
+		import tarfile, zipfile
+		self.path  = path
+		self.strip = strip
+		# The archive is read by one thread at a time
+		self.lock  = threading.Lock()
+		if zipfile.is_zipfile(path):
+			self.archive = zipfile.ZipFile(path)
+			for info in self.archive.infolist():
+				if not info.filename.endswith("/"):
+					self._add(info.filename, info.file_size, info)
+		else:
+			self.archive = tarfile.open(path)
+			for info in self.archive:
+				if info.isfile():
+					self._add(info.name, info.size, info)
+
+	def _add( self, path, size, info ):
+		parts = [_ for _ in path.split("/") if _ and _ != "."][self.strip:]
+		if parts:
+			self.add("/".join(parts), size, info)
+
+	def load( self, path, info ):
+		with self.lock:
+			if hasattr(self.archive, "extractfile"):
+				return self.archive.extractfile(info).read()
+			else:
+				return self.archive.read(info)
+
+	def close( self ):
+		self.archive.close()
+
+class OverlayFileSystem(VirtualFileSystem):
+	"""Serves the files registered with `set` from memory, and all the
+	other files from the `base` filesystem. This is used to track unsaved
+	or generated files that might not exist (see `Tracker.fromTexts`)."""
+
+	def __init__( self, base=None ):
+		super(OverlayFileSystem, self).__init__(os.path.abspath(os.sep))
+		self.base = base or FILESYSTEM
+
+	def set( self, path, text ):
+		data = text if isinstance(text, bytes) else text.encode("utf8")
+		return self.add(self.relpath(path), len(data), data)
+
+	def has( self, path ):
+		"""Tells if the file at the given path is an overlay."""
+		return self.relpath(path) in self.files
+
+	def load( self, path, data ):
+		return data
+
+	def list( self, path ):
+		names = self.base.list(path)
+		overlay = self.dirs.get(self.relpath(path))
+		if overlay:
+			names = dict(names)
+			names.update(overlay)
+		return names
+
+	def read( self, path ):
+		return super(OverlayFileSystem, self).read(path) if self.has(path) else self.base.read(path)
+
+	def stat( self, path ):
+		if self.has(path):
+			return super(OverlayFileSystem, self).stat(path)
+		return self.base.stat(path) or super(OverlayFileSystem, self).stat(path)
+
+	def identity( self, path ):
+		return super(OverlayFileSystem, self).identity(path) if self.has(path) else self.base.identity(path)
+
+	def close( self ):
+		self.base.close()
+
+FILESYSTEM = FileSystem()
+
+# -----------------------------------------------------------------------------
+#
+# CACHES
+#
+# -----------------------------------------------------------------------------
+
+class LRUCache(object):
+	"""A mapping that holds at most `limit` entries (unbounded if `None`),
+	evicting the least recently used ones first. The cache can be shared
+	between threads."""
+
+	def __init__( self, limit=None ):
+		self.limit   = limit
+		self.entries = OrderedDict()
+		self.lock    = threading.Lock()
+
+	def get( self, key, default=None ):
+		with self.lock:
+			try:
+				value = self.entries[key]
+			except KeyError:
+				return default
+			if self.limit is not None:
+				self.entries.move_to_end(key)
+			return value
+
+	def pop( self, key, default=None ):
+		with self.lock:
+			return self.entries.pop(key, default)
+
+	def clear( self ):
+		with self.lock:
+			self.entries.clear()
+		return self
+
+	def items( self ):
+		"""Returns a list of the `(key, value)` entries."""
+		with self.lock:
+			return [_ for _ in self.entries.items()]
+
+	def __contains__( self, key ):
+		return key in self.entries
+
+	def __getitem__( self, key ):
+		with self.lock:
+			value = self.entries[key]
+			if self.limit is not None:
+				self.entries.move_to_end(key)
+			return value
+
+	def __setitem__( self, key, value ):
+		with self.lock:
+			self.entries[key] = value
+			self.entries.move_to_end(key)
+			while self.limit is not None and len(self.entries) > self.limit:
+				self.entries.popitem(last=False)
+
+	def __len__( self ):
+		return len(self.entries)
+
+class IgnoreRules(object):
+	"""Gitignore-style patterns for the files and directories that should
+	be ignored. The patterns come from `.deparseignore` files (see `load`),
+	which apply to the directory they're in, and from options (see `add`),
+	which take precedence. As in gitignore, `#` starts a comment, `!`
+	negates a pattern, a trailing `/` only matches directories, a pattern
+	with a `/` is relative to its base directory (and matches any file
+	with that name otherwise) and `**` matches any number of directories.
+	The last matching pattern wins, and each pattern is compiled once.
+	A pattern matching a directory also matches everything within it.
+	Rules can be shared between threads, as the updates hold the `lock`."""
+
+	FILE = ".deparseignore"
+
+	def __init__( self, patterns=(), base=None ):
+		self.paths       = []
+		self.fromFiles   = []
+		self.fromOptions = []
+		self.rules       = []
+		self.lock        = threading.Lock()
+		if patterns:
+			self.add(patterns, base)
+
+	@staticmethod
+	def Compile( pattern ):
+		"""Returns the `(regexp, negate, directory)` for the given pattern,
+		where `regexp` matches the paths relative to the pattern's base
+		(and the paths within them, as its first group), or `None` if the
+		line has no pattern."""
+		pattern = pattern.strip()
+		if not pattern or pattern.startswith("#"):
+			return None
+		negate    = pattern.startswith("!")
+		pattern   = pattern[1:] if negate else pattern
+		directory = pattern.endswith("/")
+		pattern   = pattern.rstrip("/")
+		anchored  = "/" in pattern
+		parts     = pattern.lstrip("/").split("/")
+		regexp    = "" if anchored else "(?:.*/)?"
+		for i, part in enumerate(parts):
+			last = i == len(parts) - 1
+			if part == "**":
+				regexp += ".*" if last else "(?:.*/)?"
+				continue
+			j = 0
+			while j < len(part):
+				c = part[j]
+				if c == "*":
+					regexp += "[^/]*"
+				elif c == "?":
+					regexp += "[^/]"
+				elif c == "\\" and j + 1 < len(part):
+					j += 1
+					regexp += re.escape(part[j])
+				elif c == "[" and "]" in part[j+1:]:
+					k = part.index("]", j + 2 if part[j+1:j+2] in "!^" else j + 1)
+					body = part[j+1:k]
+					regexp += "[" + ("^" + body[1:] if body[:1] in "!^" else body) + "]"
+					j = k
+				else:
+					regexp += re.escape(c)
+				j += 1
+			if not last:
+				regexp += "/"
+		return (re.compile(regexp + "(/.*)?$"), negate, directory)
+
+	def add( self, patterns, base=None ):
+		"""Adds the given patterns, relative to the given base directory
+		(the current directory by default)."""
+		base  = os.path.abspath(base or os.getcwd())
+		rules = [(base,) + _ for _ in (self.Compile(p) for p in patterns) if _]
+		with self.lock:
+			self.fromOptions = self.fromOptions + rules
+			self.rules       = self.fromFiles + self.fromOptions
+		return self
+
+	def register( self, path ):
+		"""Registers the ignore file at the given path, returning `False`
+		if it was already registered, so that it is loaded only once."""
+		path = os.path.abspath(path)
+		with self.lock:
+			if path in self.paths:
+				return False
+			self.paths.append(path)
+			return True
+
+	def load( self, path, text=None ):
+		"""Adds the patterns of the ignore file at the given path."""
+		if text is None:
+			with open(path) as f:
+				text = f.read()
+		path  = os.path.abspath(path)
+		base  = os.path.dirname(path)
+		rules = [(base,) + _ for _ in (self.Compile(p) for p in text.split("\n")) if _]
+		with self.lock:
+			if path not in self.paths:
+				self.paths.append(path)
+			self.fromFiles = self.fromFiles + rules
+			self.rules     = self.fromFiles + self.fromOptions
+		return self
+
+	def ignored( self, path, isdir=False ):
+		"""Tells if the given path, or one of its parents, is ignored."""
+		path     = os.path.abspath(path)
+		relpaths = {}
+		ignored  = False
+		for base, regexp, negate, directory in self.rules:
+			rel = relpaths.get(base)
+			if rel is None:
+				rel = relpaths[base] = os.path.relpath(path, base).replace(os.sep, "/") if path.startswith(base) else ""
+			if not rel or rel.startswith(".."):
+				continue
+			match = regexp.match(rel)
+			# Directory patterns match directories and the paths within
+			if match and (isdir or match.group(1) or not directory):
+				ignored = not negate
+		return ignored
+
+	def filter( self, path, names ):
+		"""Returns the `name → kind` listing of the directory at the given
+		path without the ignored entries."""
+		return dict((n, k) for n, k in names.items() if not self.ignored(os.path.join(path, n), k == "d"))
+
+class DirectoryCache(object):
+	"""Caches directory listings so that existence checks and glob-style
+	queries are answered from memory, using one listing per directory of
+	the given `FileSystem` (one `os.scandir` for the local filesystem).
+
+	A cache is meant to be shared for the duration of a run (see `Tracker`
+	and `Resolver`). Long-lived processes can pass `validate=True` so that
+	each listing is checked against the directory's mtime (one `stat` per
+	query instead of one per probed file) and rescanned when it changed,
+	or call `refresh` from time to time. Calling `expire` makes a validated
+	listing be checked only once until the next call, which is what the
+	`Workspace` does for each query. The number of listings kept in memory
+	can be capped with `limit`.
+
+	The cache counts the filesystem `calls` it makes (see `count`) and
+	holds the `ResolveTrace` used by the parsers that share it, if any. It also
+	keeps the `identity` of the tracked files, so that a file reached
+	through different paths is only parsed once.
+
+	The entries matching the cache's `IgnoreRules` are left out of the
+	listings, so the ignored files and directories are never stat'ed,
+	listed, resolved or parsed. The `.deparseignore` files are loaded as
+	their directory is listed, and the parents of a directory are listed
+	before it, up to the `root` (the current directory by default), so that
+	the ignore files of all its parents within the project apply. A
+	directory missing from its parent's listing is then known not to
+	exist (or to be ignored) without being listed.
+	"""
+
+	def __init__( self, validate=False, limit=None, fs=None, ignores=None, root=None ):
+		self.validate = validate
+		self.fs       = fs or FILESYSTEM
+		self.ignores  = ignores or IgnoreRules()
+		self.root     = os.path.abspath(root) if root else None
+		self.calls    = 0
+		self.lock     = threading.Lock()
+		self.trace    = None
+		self.entries  = LRUCache(limit)
+		self.data     = LRUCache(limit)
+		self.identities = LRUCache(limit)
+		# The validated entries are not checked again within an epoch
+		# (see `expire`), `None` meaning that they are checked every time
+		self.epoch    = None
+		# The sets of directories being recorded, per thread (see `recording`)
+		self.local    = threading.local()
+
+	@contextmanager
+	def recording( self ):
+		"""Yields the set of the absolute paths of the directories that
+		are listed (or looked up) within the context, by this thread. This
+		is what the `NegativeCache` validates the misses against."""
+		stack = getattr(self.local, "recorders", None)
+		if stack is None:
+			stack = self.local.recorders = []
+		dirs = set()
+		stack.append(dirs)
+		try:
+			yield dirs
+		finally:
+			stack.pop()
+
+	def count( self ):
+		"""Counts a filesystem call, which threads sharing the cache can
+		make concurrently."""
+		with self.lock:
+			self.calls += 1
+		return self
+
+	def _record( self, path ):
+		recorders = getattr(self.local, "recorders", None)
+		if recorders:
+			for _ in recorders:
+				_.add(path)
+
+	def invalidate( self, path=None ):
+		"""Drops the listing of the directory at the given path, or all
+		the listings if no path is given."""
+		if path is None:
+			self.entries.clear()
+			self.data.clear()
+			self.identities.clear()
+		else:
+			self.entries.pop(os.path.abspath(path), None)
+			self.data.pop(os.path.abspath(path), None)
+			self.identities.pop(os.path.abspath(path), None)
+		return self
+
+	def expire( self ):
+		"""Starts a new epoch: the listings and JSON files of a validating
+		cache are checked against their mtime the first time they are used
+		afterwards, and not again until the next call."""
+		self.epoch = (self.epoch or 0) + 1
+		return self
+
+	def _fresh( self, entry ):
+		"""Tells if the given entry can be used without checking its mtime."""
+		return not self.validate or (self.epoch is not None and entry[2] == self.epoch)
+
+	def identity( self, path ):
+		"""Returns the key identifying the file at the given path whatever
+		its spelling (see `FileSystem.identity`), computed once per path."""
+		path = os.path.abspath(path)
+		key  = self.identities.get(path)
+		if key is None:
+			self.count()
+			key = self.identities[path] = self.fs.identity(path)
+		return key
+
+	def readJSON( self, path ):
+		"""Returns the parsed JSON file at the given path, or `None` if
+		it does not exist or is malformed. Each file is read at most once,
+		or once per change in mtime if the cache validates."""
+		key   = os.path.abspath(path)
+		entry = self.data.get(key)
+		if entry and self._fresh(entry):
+			return entry[1]
+		mtime = self._mtime(key)
+		if entry and entry[0] == mtime:
+			self.data[key] = (mtime, entry[1], self.epoch)
+			return entry[1]
+		value = None
+		if self.exists(key):
+			try:
+				self.count()
+				value = json.loads(self.fs.read(key).decode("utf8"))
+			except (IOError, OSError, ValueError) as e:
+				logging.error("Cannot read JSON file {0}: {1}".format(path, e))
+		self.data[key] = (mtime, value, self.epoch)
+		return value
+
+	def list( self, path ):
+		"""Returns a map of `name → kind` for the directory at the given
+		path, where kind is `d` for directories, `f` for anything else
+		and `None` for broken symlinks. Returns an empty map if the path
+		is not a directory."""
+		key   = os.path.abspath(path)
+		entry = self.entries.get(key)
+		if entry and self._fresh(entry):
+			self._record(key)
+			return entry[1]
+		if entry is None and self._within(key):
+			# The ignore files of the parent directories apply to this one,
+			# so they are listed first, from the root down. A directory that
+			# is not in its parent's listing is not listed at all.
+			parent, name = os.path.split(key)
+			if self.list(parent).get(name) != "d":
+				return {}
+		if self.ignores.rules and self.ignores.ignored(key, True):
+			return {}
+		self._record(key)
+		mtime = self._mtime(key)
+		if entry and entry[0] == mtime:
+			self.entries[key] = (mtime, entry[1], self.epoch)
+			return entry[1]
+		if entry:
+			# Files replaced since they were identified get a new inode
+			for _ in entry[1]:
+				self.identities.pop(os.path.join(key, _), None)
+		self.count()
+		names = self.fs.list(key)
+		if names.get(IgnoreRules.FILE) == "f":
+			self._loadIgnores(os.path.join(key, IgnoreRules.FILE))
+		if self.ignores.rules:
+			names = self.ignores.filter(key, names)
+		self.entries[key] = (mtime, names, self.epoch)
+		return names
+
+	def _within( self, path ):
+		"""Tells if the given absolute path is strictly within the `root`,
+		which bounds the listing of the parent directories."""
+		root = (self.root or os.getcwd()).rstrip(os.sep) + os.sep
+		return path.startswith(root) and len(path) > len(root)
+
+	def _loadIgnores( self, path ):
+		"""Loads the given ignore file, dropping the listings it applies to."""
+		if not self.ignores.register(path):
+			return
+		try:
+			self.count()
+			self.ignores.load(path, self.fs.read(path).decode("utf8"))
+		except (IOError, OSError, ValueError) as e:
+			logging.error("Cannot read ignore file {0}: {1}".format(path, e))
+			return
+		base = os.path.dirname(path) + os.sep
+		for k, _ in self.entries.items():
+			if k.startswith(base):
+				self.entries.pop(k)
+
+	def refresh( self ):
+		"""Drops the listings and JSON files whose mtime changed, returning
+		the number of dropped entries."""
+		changed = 0
+		for cache in (self.entries, self.data):
+			stale = [k for k, v in cache.items() if v[0] != self._mtime(k)]
+			for k in stale:
+				cache.pop(k)
+			changed += len(stale)
+		# Files replaced since they were identified get a new inode
+		self.identities.clear()
+		return changed
+
+	def read( self, path ):
+		"""Returns the content of the file at the given path as bytes."""
+		self.count()
+		return self.fs.read(path)
+
+	def stat( self, path ):
+		"""Equivalent of `os.stat`, returning `None` if the path does not
+		exist."""
+		self.count()
+		return self.fs.stat(path)
+
+	def _mtime( self, path ):
+		self.count()
+		return self.fs.mtime(path)
+
+	def _kind( self, path ):
+		parent, name = os.path.split(os.path.abspath(path))
+		if not name:
+			# This is the root directory
+			return "d"
+		return self.list(parent).get(name)
+
+	def exists( self, path ):
+		"""Equivalent of `os.path.exists`."""
+		return self._kind(path) is not None
+
+	def isdir( self, path ):
+		"""Equivalent of `os.path.isdir`."""
+		return self._kind(path) == "d"
+
+	def glob( self, pattern ):
+		"""Equivalent of `glob.glob`, where wildcards in the directories
+		are expanded one component at a time."""
+		parent, name = os.path.split(pattern)
+		if glob.has_magic(parent):
+			return [_ for d in self.glob(parent) if self.isdir(d) for _ in self.glob(os.path.join(d, name))]
+		elif not name:
+			return [pattern] if self.isdir(parent) else []
+		elif not glob.has_magic(name):
+			return [pattern] if name in self.list(parent or os.curdir) else []
+		else:
+			names = self.list(parent or os.curdir)
+			if not name.startswith("."):
+				names = (_ for _ in names if not _.startswith("."))
+			return [os.path.join(parent, _) for _ in fnmatch.filter(names, name)]
+
+class NegativeCache(object):
+	"""Remembers the items that could not be resolved, keyed by
+	`(type, name, roots)` where `roots` are the directories the search
+	started from (see `NegativeCache.Key`). The cache holds at most `limit`
+	entries, evicting the oldest ones first.
+
+	By default a miss is remembered for the rest of the run. Long-lived
+	processes can set a `ttl` (in seconds) and/or `validate=True`, in which
+	case an entry expires as soon as the mtime of one of its roots, or of
+	one of the directories that were probed to resolve it, changes (see
+	`DirectoryCache.recording`).
+	"""
+
+	def __init__( self, limit=10000, ttl=None, validate=False ):
+		self.limit    = limit
+		self.ttl      = ttl
+		self.validate = validate
+		self.entries  = OrderedDict()
+		self.lock     = threading.Lock()
+
+	@staticmethod
+	def Key( item, path=None, dirs=(), cache=None ):
+		"""Returns the key for the given item `(type, name)` when resolved
+		from the given path and extra directories, mirroring the directories
+		used by `LineParser.resolve`. The given `DirectoryCache` (the one
+		used to resolve) tells if the path is a directory."""
+		t, name = item
+		if path:
+			isdir = cache.isdir(path) if cache else os.path.isdir(path)
+			base  = os.path.abspath(path) if isdir else os.path.dirname(os.path.abspath(path))
+		else:
+			base = None
+		return (t, name, tuple(dirs) + (os.getcwd(), base))
+
+	def _mtimes( self, roots ):
+		res = []
+		for _ in roots:
+			try:
+				res.append(os.stat(_).st_mtime_ns if _ else None)
+			except OSError:
+				res.append(None)
+		return tuple(res)
+
+	def get( self, key, default=None ):
+		"""Returns the value registered for the given key, or `default` if
+		there is none or if it expired."""
+		with self.lock:
+			entry = self.entries.get(key)
+		if entry is None:
+			return default
+		created, dirs, mtimes, value = entry
+		if (self.ttl is not None and time.time() - created > self.ttl) or (self.validate and mtimes != self._mtimes(dirs)):
+			with self.lock:
+				# The entry might have been replaced in the meantime
+				if self.entries.get(key) is entry:
+					del self.entries[key]
+			return default
+		return value
+
+	def __contains__( self, key ):
+		return self.get(key) is not None
+
+	def __len__( self ):
+		return len(self.entries)
+
+	def set( self, key, value, probed=() ):
+		"""Registers the given value for the given key, where `probed` are
+		the directories that were looked into, in addition to the roots."""
+		dirs  = None
+		if self.validate:
+			dirs = tuple(key[2]) + tuple(sorted(_ for _ in probed if _ not in key[2]))
+		entry = (time.time(), dirs, self._mtimes(dirs) if self.validate else None, value)
+		with self.lock:
+			self.entries.pop(key, None)
+			self.entries[key] = entry
+			while self.limit is not None and len(self.entries) > self.limit:
+				self.entries.popitem(last=False)
+		return self
+
+	def add( self, key, probed=() ):
+		"""Registers the given key as a miss."""
+		return self.set(key, True, probed)
+
+	def clear( self ):
+		with self.lock:
+			self.entries.clear()
+		return self
+
+class ResolutionCache(NegativeCache):
+	"""Remembers the `(type, path)` list each item resolved to, with the
+	same keys and expiration rules as the `NegativeCache`: with
+	`validate=True`, a result is dropped as soon as one of the directories
+	probed to find it changes, like when a file that would take precedence
+	is added."""
+
+	def __init__( self, limit=None, ttl=None, validate=False ):
+		super(ResolutionCache, self).__init__(limit, ttl, validate)
+
+class ParseCache(object):
+	"""Remembers the provides and requires of parsed files, keyed by
+	`(path, type, parser)`, for at most `limit` files. An entry is reused
+	as long as the file's mtime and size are unchanged. This implements
+	the `Tracker.parsed` hook, so that trackers sharing a parse cache
+	(see `Workspace`) don't parse the same file twice."""
+
+	def __init__( self, limit=None ):
+		self.entries = LRUCache(limit)
+
+	def get( self, path, type, parser_type ):
+		"""Returns the `(provides, requires)` of the given file if it
+		was already parsed and did not change, `None` otherwise."""
+		key   = (os.path.abspath(path), type, parser_type)
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+		if (stat.st_mtime_ns, stat.st_size) != entry[0]:
+			self.entries.pop(key)
+			return None
+		# We return copies, as trackers might update the lists
+		return ([_ for _ in entry[1]], [_ for _ in entry[2]])
+
+	def set( self, path, type, parser_type, parser ):
+		"""Registers the provides and requires of the given parser."""
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return parser
+		key = (os.path.abspath(path), type, parser_type)
+		self.entries[key] = ((stat.st_mtime_ns, stat.st_size), tuple(parser.provides), tuple(parser.requires))
+		return parser
+
+	def clear( self ):
+		self.entries.clear()
+		return self
+
+class ResolveTrace(object):
+	"""Records how the items are resolved, to find out why a lookup is slow.
+	For each resolved item, the trace has the directories and patterns
+	that were probed, the number of filesystem calls (see
+	`DirectoryCache.calls`), the time spent, the rules that matched and the
+	first one of them, which produced the main match. Rules are named
+	after the class that implements them, like `LineParser:module` or
+	`JavaScript:node`. Traces are enabled
+	by setting the `trace` of the `DirectoryCache` used to resolve:
+
+	```
+	tracker = Tracker()
+	tracker.cache.trace = ResolveTrace()
+	tracker.fromPath("page.paml", recursive=True)
+	tracker.cache.trace.save("trace.json")
+	```
+
+	The resolutions nested in another one (like `Tracker.resolve` falling
+	back to `Resolver.find`) are recorded as part of it. Each thread has
+	its own stack of resolutions, so a trace can be shared between threads."""
+
+	def __init__( self ):
+		self.entries = []
+		self.local   = threading.local()
+
+	@property
+	def stack( self ):
+		stack = getattr(self.local, "stack", None)
+		if stack is None:
+			stack = self.local.stack = []
+		return stack
+
+	def start( self, item, path, cache ):
+		"""Starts recording the resolution of the given item from the
+		given path."""
+		if self.stack:
+			self.stack.append(None)
+		else:
+			self.stack.append({
+				"type"    : item[0],
+				"name"    : item[1],
+				"from"    : path,
+				"rule"    : None,
+				"rules"   : [],
+				"probes"  : [],
+				"fsCalls" : cache.calls,
+				"time"    : time.perf_counter(),
+			})
+		return self
+
+	def end( self, resolved, cache ):
+		"""Ends the recording started by the matching `start`."""
+		entry = self.stack.pop()
+		if entry:
+			entry["fsCalls"]  = cache.calls - entry["fsCalls"]
+			entry["time"]     = round(time.perf_counter() - entry["time"], 6)
+			entry["resolved"] = [_[1] for _ in resolved or ()]
+			self.entries.append(entry)
+		return self
+
+	def probe( self, **probe ):
+		"""Records a probe (like a `dir` and `pattern` with the number of
+		`matches`) for the current resolution, if any."""
+		if self.stack:
+			self.stack[0]["probes"].append(probe)
+		return self
+
+	def rule( self, name, matches ):
+		"""Records the `(type, path)` matched by the given rule."""
+		if self.stack and matches:
+			entry = self.stack[0]
+			rule  = {"rule":name, "matches":[_[1] for _ in matches]}
+			# The parsers tried by the `Resolver` share the same rules
+			if rule not in entry["rules"]:
+				entry["rules"].append(rule)
+			entry["rule"] = entry["rule"] or name
+		return self
+
+	def note( self, key, value ):
+		"""Sets the given key of the current resolution."""
+		if self.stack:
+			self.stack[0].setdefault(key, value)
+		return self
+
+	def export( self ):
+		return {
+			"resolutions" : self.entries,
+			"time"        : round(sum(_["time"] for _ in self.entries), 6),
+			"fsCalls"     : sum(_["fsCalls"] for _ in self.entries),
+			"probes"      : sum(len(_["probes"]) for _ in self.entries),
+		}
+
+	def save( self, path ):
+		with open(path, "w") as f:
+			json.dump(self.export(), f, indent=1)
+		return self
+
+class Digests(object):
+	"""Maintains the content digests of files, keyed by absolute path. A
+	digest is reused as long as the file's mtime and size are unchanged,
+	and digests can be saved to/loaded from a JSON file so that they
+	are reused across runs. The files are read from the given `FileSystem`."""
+
+	ALGORITHM = "sha256"
+
+	def __init__( self, path=None, workers=None, fs=None ):
+		self.path    = path
+		self.workers = workers
+		self.fs      = fs or FILESYSTEM
+		self.entries = {}
+		if path and os.path.exists(path):
+			self.load(path)
+
+	def load( self, path ):
+		try:
+			with open(path) as f:
+				data = json.load(f)
+			if data.get("algorithm") == self.ALGORITHM:
+				self.entries.update((k, tuple(v)) for k,v in data.get("files", {}).items())
+		except (IOError, OSError, ValueError, AttributeError) as e:
+			logging.error("Cannot load digests from {0}: {1}".format(path, e))
+		return self
+
+	def save( self, path=None ):
+		path = path or self.path
+		with open(path, "w") as f:
+			json.dump({"algorithm":self.ALGORITHM, "files":dict(self.entries)}, f)
+		return self
+
+	def set( self, path, data, stat=None ):
+		"""Registers the digest of the given file content, read from the
+		file at the given path with the given `os.stat` result."""
+		stat   = stat or self.fs.stat(path)
+		digest = hashlib.new(self.ALGORITHM, data).hexdigest()
+		self.entries[os.path.abspath(path)] = (stat.st_mtime_ns, stat.st_size, digest)
+		return digest
+
+	def get( self, path ):
+		"""Returns the digest of the file at the given path if it is
+		known and the file did not change, `None` otherwise."""
+		entry = self.entries.get(os.path.abspath(path))
+		if not entry:
+			return None
+		stat = self.fs.stat(path)
+		if stat and (stat.st_mtime_ns, stat.st_size) == (entry[0], entry[1]):
+			return entry[2]
+		return None
+
+	def compute( self, path ):
+		"""Returns the digest of the file at the given path, reading it
+		only if it changed."""
+		digest = self.get(path)
+		if digest is None:
+			digest = self.set(path, self.fs.read(path))
+		return digest
+
+	def computeAll( self, paths ):
+		"""Returns the list of digests for the given paths, reading the
+		changed files in parallel."""
+		missing = [_ for _ in paths if self.get(_) is None]
+		if len(missing) > 1:
+			from concurrent.futures import ThreadPoolExecutor
+			with ThreadPoolExecutor(max_workers=self.workers) as pool:
+				for _ in pool.map(self.compute, missing): pass
+		return [self.compute(_) for _ in paths]
+
+# -----------------------------------------------------------------------------
+#
+# LINE PARSER
+#
+# -----------------------------------------------------------------------------
+
 class LineParser(object):
 	"""An abstract line-based parser. It looks for lines matching the
 	regular expressions defined the `LINES` map and executes the corresponding
@@ -53,11 +1101,36 @@ class LineParser(object):
 
 	The `LineParser.PATH` map defines paths where specific item types
 	are expected to be found. You can configure these at runtime so that
-	the items can be properly resolved by the `resolve` method.
+	the items can be properly resolved by the `resolve` method, which
+	uses the parser's `cache` (a `DirectoryCache`) when it is set.
+
+	Lines longer than `LONG_LINE` characters (typically minified files) are
+	scanned for every match of the `LINES` expressions (see `scanLine`)
+	and files larger than `MAX_SIZE` bytes are skipped with a warning.
+
+	The `Tracker`, `Resolver` and `Workspace` take a snapshot of `PATHS`,
+	`LONG_LINE`, `MAX_SIZE` and of the `Component` and `NodeModules`
+	options when they are created (see `Configuration`) and apply it to
+	the parsers they create, so changing these at runtime only affects
+	the objects created afterwards.
+
+	Parsers can be reused: `parsePath` and `parse` start with `reset`,
+	which drops the state of the previous parse (subclasses with their own
+	state extend it), so that a `ParserPool` can hand out the same
+	instances for every file of a run.
 	"""
 
-	LINES   = {}
-	OPTIONS = {}
+	LINES     = {}
+	OPTIONS   = {}
+	# The statement boundaries within long lines (see `scanLine`)
+	RE_STATEMENT     = re.compile("(?:^|[;{}])\\s*")
+	RE_STATEMENT_END = re.compile("[;{}]")
+	LONG_LINE = 4096
+	MAX_SIZE  = 16 * 1024 * 1024
+	# The `Component.OPTIONS` and `NodeModules.OPTIONS` snapshots, the
+	# live ones being used when these are `None`
+	COMPONENTS   = None
+	NODE_MODULES = None
 	PATHS   = {
 		"js:module"   : ["lib/js"  , "src/js"  , ""],
 		"js:gmodule"  : ["lib/js"  , "src/js"  , ""],
@@ -65,36 +1138,102 @@ class LineParser(object):
 		"sjs:gmodule" : ["lib/sjs" , "src/sjs" , ""],
 		"css:module"  : ["lib/css" , "src/css" , ""],
 		"pcss:module" : ["lib/pcss", "src/pcss", ""],
+		"js:node"     : ["node_modules"],
 	}
 
+	@classmethod
+	def Configuration( cls, **overrides ):
+		"""Returns an immutable snapshot of the current configuration of
+		the parsers, to be given to `configure`, where the given overrides
+		(like `MAX_SIZE=0`) replace the current values."""
+		snapshot = lambda options:MappingProxyType(dict((k, tuple(v)) for k, v in options.items()))
+		configuration = {
+			"PATHS"        : snapshot(cls.PATHS),
+			"LONG_LINE"    : cls.LONG_LINE,
+			"MAX_SIZE"     : cls.MAX_SIZE,
+			"COMPONENTS"   : snapshot(Component.OPTIONS),
+			"NODE_MODULES" : snapshot(NodeModules.OPTIONS),
+		}
+		for k, v in overrides.items():
+			if k not in configuration:
+				raise KeyError("Unknown parser configuration: {0}".format(k))
+			configuration[k] = v
+		return MappingProxyType(configuration)
+
 	def __init__( self ):
 		self.path     = None
 		self.type     = None
 		self.provides = []
 		self.requires = []
+		# The `DirectoryCache` used by `resolve`, if any
+		self.cache    = None
+		# The `Digests` updated by `parsePath`, if any
+		self.digests  = None
+		# The `ParserPool` this parser and its subparsers come from, if any
+		self.pool     = None
+
+	def reset( self ):
+		"""Drops the state of the previous parse. The `provides` and
+		`requires` are new lists, as the previous ones might still be
+		referenced by the caller."""
+		self.path     = None
+		self.type     = None
+		self.provides = []
+		self.requires = []
+		return self
+
+	def configure( self, configuration ):
+		"""Overrides the class configuration for this parser with the given
+		snapshot (see `Configuration`)."""
+		for k, v in configuration.items():
+			setattr(self, k, v)
+		return self
 
 	def parsePath( self, path, type=None ):
+		self.reset()
 		self.path = path
 		self.type = type
-		if not os.path.exists(path):
+		if not self._exists(path):
 			logging.error("{1} parser cannot parse path {0} because it does not exist.".format(path, self.__class__.__name__))
+		elif self.MAX_SIZE and self._fs().stat(path).st_size > self.MAX_SIZE:
+			logging.warning("{1} parser skips path {0} as it is larger than {2} bytes".format(path, self.__class__.__name__, self.MAX_SIZE))
+			self.onParse(path, type)
+			self.onParseEnd(path, type)
 		else:
-			with open(path) as f:
-				self.onParse(path, type)
-				for line in f.readlines():
-					self.parseLine(line)
-				self.onParseEnd(path, type)
+			lines = self._readLines(path)
+			self.onParse(path, type)
+			for line in lines:
+				self.parseLine(line)
+			self.onParseEnd(path, type)
 		self.path = None
 		self.type = None
 		return self
 
+	def _readLines( self, path ):
+		"""Returns the lines of the file at the given path. When the parser
+		has `digests`, the digest of the file is registered from the bytes
+		that are read for parsing."""
+		fs = self._fs()
+		if self.digests is None and fs is FILESYSTEM:
+			with open(path) as f:
+				return f.readlines()
+		data = fs.read(path)
+		if self.digests is not None:
+			self.digests.set(path, data, fs.stat(path))
+		return io.TextIOWrapper(io.BytesIO(data)).readlines()
+
 	def parseText( self, text, path=None, type=None ):
 		return self.parse(text, path=path, type=type)
 
 	def parse( self, text, path=None, type=None ):
-		self.onParse(path or self.path, type)
+		path = path or self.path
+		self.reset()
+		self.path = path
+		self.type = type
+		self.onParse(path, type)
 		for line in text.split("\n"):
 			self.parseLine(line)
+		self.onParseEnd(path, type)
 		return self
 
 	def normpath( self, path ):
@@ -104,6 +1243,8 @@ class LineParser(object):
 		return os.path.normpath(os.path.join(os.path.dirname(self.path), path)) if self.path else os.path.normpath(path)
 
 	def parseLine( self, line ):
+		if self.LONG_LINE and len(line) > self.LONG_LINE:
+			return self.scanLine(line)
 		for name, expr in self.LINES.items():
 			match = re.match(expr, line)
 			if match:
@@ -111,12 +1252,88 @@ class LineParser(object):
 				break
 		return self
 
+	def scanLine( self, line ):
+		"""Like `parseLine`, but for long lines where more than one
+		element can be declared (like minified files). The `LINES`
+		expressions that are not anchored with `^` (or that start with `^.*`)
+		are matched anywhere in the line, at word boundaries, and the
+		anchored ones at the start of each statement (the line start and
+		after `;`, `{` or `}`), without going past the statement's end.
+		The handlers are called in order of appearance, with the matched
+		text (or the statement) as line, the scan resuming at the end of
+		each match."""
+		scanners = self._Scanners()
+		# The next match of each expression, searched again once the scan
+		# moved past its start, and `False` once there is none.
+		found    = [None for _ in scanners]
+		offset   = 0
+		while True:
+			best = None
+			for order, (name, regexp, anchored) in enumerate(scanners):
+				match = found[order]
+				if match is False:
+					continue
+				if match is None or match.start() < offset:
+					match = found[order] = self._scan(line, offset, regexp, anchored) or False
+					if match is False:
+						continue
+				if best is None or match.start() < best[1].start():
+					best = (order, match)
+			if best is None:
+				break
+			order, match = best
+			name, regexp, anchored = scanners[order]
+			getattr(self, name)(line[match.start():match.endpos] if anchored else match.group(), match)
+			offset = max(match.end(), match.start() + 1)
+		return self
+
+	def _scan( self, line, offset, regexp, anchored ):
+		"""Returns the first match of the given `_Scanners` expression in
+		the given line, from the given offset, or `None`."""
+		if not anchored:
+			return regexp.search(line, offset)
+		for statement in self.RE_STATEMENT.finditer(line, offset):
+			start = statement.end()
+			end   = self.RE_STATEMENT_END.search(line, start)
+			match = regexp.match(line, start, end.start() if end else len(line))
+			if match:
+				return match
+		return None
+
+	@classmethod
+	def _Scanners( cls ):
+		"""Returns the list of `(handler, regexp, anchored)` used by
+		`scanLine`, compiled once per class. The anchored expressions are
+		compiled without their `^`, as they are matched from the start of
+		each statement."""
+		scanners = cls.__dict__.get("_scanners")
+		if scanners is None:
+			scanners = []
+			for name, expr in cls.LINES.items():
+				anchored = expr.startswith("^") and not expr.startswith("^.*")
+				if anchored:
+					expr = expr[1:]
+				else:
+					expr = "(?<![\\w$])(?:" + (expr[3:] if expr.startswith("^.*") else expr) + ")"
+				scanners.append((name, re.compile(expr), anchored))
+			cls._scanners = scanners
+		return scanners
+
 	def onParse( self, path, type ):
 		pass
 
 	def onParseEnd( self, path, type ):
 		pass
 
+	def _subparser( self, parser_type ):
+		"""Returns a parser of the given type for embedded content, taken
+		from the `pool` if any, to be given back with `_releaseSubparser`."""
+		return self.pool.get(parser_type) if self.pool else parser_type()
+
+	def _releaseSubparser( self, parser ):
+		if self.pool:
+			self.pool.release(parser)
+
 	# FIXME: From an architecture standpoint, this should be pluggable.
 	def resolve( self, item, path, dirs=(), verbose=False ):
 		"""Finds the actual path for the given item `(type, name)`, returning
@@ -125,7 +1342,10 @@ class LineParser(object):
 		cwd     = os.path.abspath(".")
 		t, name = item
 		res     = []
-		dirs    = [_ for _ in dirs] + [os.getcwd(), os.path.dirname(os.path.abspath(path)) if not os.path.isdir(path) else os.path.abspath(path)]
+		# The directory of the path is often the current directory, which
+		# would otherwise be probed twice
+		dirs    = self._unique([_ for _ in dirs] + [os.getcwd(), os.path.dirname(os.path.abspath(path)) if not self._isdir(path) else os.path.abspath(path)])
+		trace   = self.cache.trace if self.cache else None
 		# TODO: Support resolvers
 		if not t or t in ("js:module", "sjs:module"):
 			name = name.replace(".", "/")
@@ -134,6 +1354,7 @@ class LineParser(object):
 			all_dirs = self._subdirs(dirs, *self.PATHS["sjs:module"])
 			sjs_modules = sorted([("sjs:module", _) for _ in self._glob(all_dirs, "{0}.sjs".format(name ),  "{0}*-*.sjs".format(name))])
 			res += sjs_modules if sjs_modules else (js_modules[-1],) if js_modules else ()
+			if trace: trace.rule(self._ruleName("module", LineParser), sjs_modules or js_modules[-1:])
 		if not t or t in ("js:gmodule", "sjs:gmodule"):
 			name = name.replace(".", "/")
 			all_dirs = self._subdirs(dirs, *self.PATHS["js:module"])
@@ -141,26 +1362,34 @@ class LineParser(object):
 			all_dirs = self._subdirs(dirs, *self.PATHS["sjs:module"])
 			sjs_modules = sorted([("sjs:gmodule", _) for _ in self._glob(all_dirs, "{0}*.sjs".format(name), "{0}*-*.sjs".format(name))])
 			res += sjs_modules if sjs_modules else (js_modules[-1],) if js_modules else ()
+			if trace: trace.rule(self._ruleName("gmodule", LineParser), sjs_modules or js_modules[-1:])
 		if t and t in ("js:component", "sjs:component"):
-			res += Component.Resolve(item, path ,dirs)
+			components = Component.Resolve(item, path ,dirs, cache=self.cache, options=self.COMPONENTS)
+			res += components
+			if trace: trace.rule(self._ruleName("component", Component), components)
 		if not t or t in ("css:module" ,"pcss:module"):
-			all_dirs = [cwd] + self._subdirs(dirs, *self.PATHS["css:module"])
+			all_dirs = self._unique([cwd] + self._subdirs(dirs, *self.PATHS["css:module"]))
 			css_modules  = sorted([("css:module",  _) for _ in self._glob(all_dirs, "{0}.css".format(name))])
-			all_dirs = [cwd] + self._subdirs(dirs, *self.PATHS["pcss:module"])
+			all_dirs = self._unique([cwd] + self._subdirs(dirs, *self.PATHS["pcss:module"]))
 			pcss_modules = sorted([("pcss:module", _) for _ in self._glob(all_dirs, "{0}*.pcss".format(name))])
 			res += pcss_modules if pcss_modules else (css_modules[-1],) if css_modules else ()
+			if trace: trace.rule(self._ruleName("css", LineParser), pcss_modules or css_modules[-1:])
 		if not t or t.endswith(":file"):
 			altname = name + ("." + t.split(":",1)[0] if t else "")
 			ext     = name.rsplit(".", 1)[-1]
 			visited = []
+			files   = []
 			for n in (name, altname, "lib/" + ext + "/" + name, "lib/" + ext + "/", altname):
 				for d in dirs:
 					p = os.path.join(d, n)
-					if p not in visited and os.path.exists(p):
-						res.append(("*:file", p))
+					if p not in visited and self._exists(p):
+						files.append(("*:file", p))
 						visited.append(p)
+			res += files
+			if trace: trace.rule(self._ruleName("file", LineParser), files)
 		if t and t.endswith(":url"):
 			res.append(item)
+			if trace: trace.rule(self._ruleName("url", LineParser), [item])
 		res = self._resolve( res, item, path, dirs=() )
 		if verbose and not res:
 			logging.error("Unresolved item in {0}: {1} at {2}".format(self.__class__.__name__, item, path))
@@ -172,28 +1401,62 @@ class LineParser(object):
 		return resolved
 
 	def _subdirs( self, dirs, *subdirs):
-		"""Returns `len(dirs) * len(subdirs)` directories where each `subdir` is joined
-		with all the `dirs`."""
+		"""Returns the directories where each `subdir` is joined with all the
+		`dirs`, followed by the `dirs`, without duplicates."""
 		res = []
 		for sd in subdirs:
 			res += [os.path.join(d,sd) for d in dirs]
 		res += dirs
+		return self._unique(res)
+
+	def _unique( self, dirs ):
+		"""Returns the given directories without duplicates (ignoring
+		trailing separators), in order."""
+		res  = []
+		seen = set()
+		for d in dirs:
+			k = os.path.normpath(d)
+			if k not in seen:
+				seen.add(k)
+				res.append(d)
 		return res
 
 	def _glob( self, dirs, *expressions ):
 		matches = []
+		trace   = self.cache.trace if self.cache else None
 		for d in dirs:
 			for e in expressions:
 				p = os.path.join(d, e)
-				matches += glob.glob(p)
+				m = self.cache.glob(p) if self.cache else glob.glob(p)
+				if trace: trace.probe(dir=d, pattern=e, matches=len(m))
+				matches += m
 		return sorted(matches)
 
+	def _exists( self, path ):
+		if not self.cache:
+			return os.path.exists(path)
+		exists = self.cache.exists(path)
+		if self.cache.trace: self.cache.trace.probe(path=path, exists=exists)
+		return exists
+
+	def _ruleName( self, rule, owner ):
+		"""Returns the name of the given resolution rule as recorded in the
+		`ResolveTrace`, prefixed with the class that implements it rather
+		than the parser's, as the `Resolver` tries every parser in turn."""
+		return "{0}:{1}".format(owner.__name__, rule)
+
+	def _isdir( self, path ):
+		return self.cache.isdir(path) if self.cache else os.path.isdir(path)
+
+	def _fs( self ):
+		return self.cache.fs if self.cache else FILESYSTEM
+
 	def _normalizeSymbol( self, type, name ):
 		if type:
 			type = type + ":*"
 		else:
 			type = "*"
-		return (type, name)
+		return Symbol(type, name)
 
 	def _unquote( self, text ):
 		if text and len(text) > 1 and text[0] == text[-1] and text[0] in '\'"':
@@ -208,6 +1471,38 @@ class LineParser(object):
 			requires=self.requires,
 		)
 
+class ParserPool(object):
+	"""Reusable parser instances, so that a run does not create a parser
+	for each parsed file, embedded script or block. The parsers are
+	configured with the given `configuration` snapshot (see
+	`LineParser.Configuration`) and their subparsers come from the pool
+	too. Parsers given back with `release` are `reset` and handed out
+	again by `get`. A pool is used by one run at a time, like the
+	`Tracker` that owns it."""
+
+	def __init__( self, configuration=None ):
+		self.configuration = configuration or LineParser.Configuration()
+		self.free    = {}
+		self.created = 0
+
+	def get( self, parser_type ):
+		"""Returns a parser of the given type, ready to parse."""
+		free = self.free.get(parser_type)
+		if free:
+			return free.pop()
+		self.created += 1
+		parser      = parser_type().configure(self.configuration)
+		parser.pool = self
+		return parser
+
+	def release( self, parser ):
+		"""Gives back the given parser, whose results must not be used
+		afterwards (the lists of `provides` and `requires` can still be)."""
+		free = self.free.setdefault(parser.__class__, [])
+		if parser.pool is self and parser not in free:
+			free.append(parser.reset())
+		return self
+
 # -----------------------------------------------------------------------------
 #
 # C PARSER
@@ -223,10 +1518,10 @@ class C(LineParser):
 
 	def onParse( self, path, type ):
 		module = os.path.basename(path).rsplit("-",1)[0]
-		self.provides = [("c:header", module)]
+		self.provides = [Symbol("c:header", module)]
 
 	def onInclude( self, line, match ):
-		self.requires.append(("c:header",match.group(1)))
+		self.requires.append(Symbol("c:header",match.group(1)))
 
 # -----------------------------------------------------------------------------
 #
@@ -239,7 +1534,7 @@ class JavaScript(LineParser):
 
 	# SEE: https://github.com/google/closure-library/wiki/goog.module:-an-ES6-module-like-alternative-to-goog.provide
 	LINES = {
-		"onRequire"       : "(var\s+|exports\.)([\w\d_]+)\s*=\s*require\s*\(([^\)]+)\)(\.([\w\d_]+))?(\.([\w\d_]+))?\s*;?",
+		"onRequire"       : "(var\s+|exports\.|,\s*)([\w\d_]+)\s*=\s*require\s*\(([^\)]+)\)(\.([\w\d_]+))?(\.([\w\d_]+))?\s*;?",
 		"onImport"        : "\s*import\s+({[^}]*}|\*(\s+as\s+[_\-\w]+)|[_\-\w]+)\s*(from\s+['\"]([^'\"]+)['\"])?",
 		"onGoogleProvide" : "goog\.(provide|module)\s*\(['\"](^['\"]+)['\"]\)",
 		"onGoogleRequire" : "goog\.require\s*\(['\"](^['\"]+)['\"]\)",
@@ -248,19 +1543,24 @@ class JavaScript(LineParser):
 	def onParse( self, path, type ):
 		if path:
 			module  = os.path.basename(path).rsplit("-",1)[0]
-			self.provides = [(self.type or "js:module", module)]
+			self.provides = [Symbol(self.type or "js:module", module)]
 		else:
-			self.provdes = []
+			self.provides = []
 
 	def onRequire( self, line, match ):
 		decl, name, module, __, symbol, __, subsymbol = match.groups()
-		self.requires.append((self.type or "js:module", module))
+		module = self._unquote(module.strip())
+		if module.startswith("."):
+			path = os.path.normpath(os.path.join(os.path.dirname(self.path or "."), module))
+			self.requires.append(Symbol("js:file", path))
+		else:
+			self.requires.append(Symbol(self._moduleType(), module))
 
 	def onGoogleProvide( self, line, match ):
-		self.provides.append(("js:gmodule", match.group(1)))
+		self.provides.append(Symbol("js:gmodule", match.group(1)))
 
 	def onGoogleRequire( self, line, match ):
-		self.requires.append(("js:gmodule", match.group(1)))
+		self.requires.append(Symbol("js:gmodule", match.group(1)))
 
 	def onImport( self, line, match ):
 		module = match.groups()[-1]
@@ -268,9 +1568,161 @@ class JavaScript(LineParser):
 			return
 		if module.startswith("."):
 			path = os.path.normpath(os.path.join(os.path.dirname(self.path or "."), module))
-			self.requires.append(("js:file", path))
+			self.requires.append(Symbol("js:file", path))
 		else:
-			self.requires.append((self.type or "js:module", module))
+			self.requires.append(Symbol(self._moduleType(), module))
+
+	def _moduleType( self ):
+		"""Returns the type of the modules required by this file, which is
+		the type of the file if it was resolved as a module."""
+		return self.type if self.type and self.type.endswith(":module") else "js:module"
+
+	def _resolve( self, resolved, item, path, dirs ):
+		"""Resolves bare module names using `NodeModules` when they cannot
+		be found in the `PATHS`."""
+		t, name = item
+		if not resolved and t in (None, "js:module") and NodeModules.IsBare(name):
+			resolved = NodeModules(self.cache, self.PATHS.get("js:node"), self.NODE_MODULES).resolve(name, path)
+			if self.cache and self.cache.trace: self.cache.trace.rule(self._ruleName("node", JavaScript), resolved)
+		return resolved
+
+# -----------------------------------------------------------------------------
+#
+# NODE MODULES
+#
+# -----------------------------------------------------------------------------
+
+class NodeModules(object):
+	"""Resolves bare module names the way Node does: the `node_modules`
+	directories (see `LineParser.PATHS["js:node"]`) are looked up from the
+	requiring file up to the root, and packages are resolved using the
+	`exports`, `main`/`module` fields of their `package.json` and their
+	index files.
+
+	All the lookups go through the given `DirectoryCache`, so that each
+	`package.json` is read at most once per run."""
+
+	OPTIONS = {
+		"fields"     : ("main", "module"),
+		"conditions" : ("require", "node", "import", "default"),
+		"extensions" : (".js", ".json", ".mjs", ".cjs"),
+		"index"      : ("index.js", "index.json"),
+	}
+
+	@staticmethod
+	def IsBare( name ):
+		"""Tells if the given name is a bare module specifier, like `lodash`
+		or `@scope/pkg/sub`."""
+		return bool(name) and not name.startswith(".") and not os.path.isabs(name) and "://" not in name
+
+	@staticmethod
+	def Split( name ):
+		"""Splits the given bare module name into `(package, subpath)`."""
+		parts = name.split("/")
+		n     = 2 if name.startswith("@") else 1
+		return "/".join(parts[:n]), "/".join(parts[n:])
+
+	def __init__( self, cache=None, modules=None, options=None ):
+		self.cache   = cache or DirectoryCache()
+		self.modules = modules
+		self.options = options or self.OPTIONS
+
+	def resolve( self, name, path=None ):
+		"""Returns the list of `(type, path)` the given bare module name
+		resolves to when required from the given path."""
+		package, subpath = self.Split(name)
+		path   = os.path.abspath(path or ".")
+		parent = path if self.cache.isdir(path) else os.path.dirname(path)
+		while True:
+			for modules in (LineParser.PATHS.get("js:node") if self.modules is None else self.modules) or ():
+				d = os.path.join(parent, modules, package)
+				if self.cache.isdir(d):
+					res = self.resolvePackage(d, subpath)
+					if res:
+						return [("js:module", res)]
+			if os.path.dirname(parent) == parent:
+				return []
+			parent = os.path.dirname(parent)
+
+	def resolvePackage( self, path, subpath="" ):
+		"""Resolves the given subpath in the package at the given path."""
+		meta = self.cache.readJSON(os.path.join(path, "package.json")) or {}
+		if not isinstance(meta, dict): meta = {}
+		exports = meta.get("exports")
+		if exports is not None:
+			# NOTE: Unlike Node, we take the first exported target that
+			# exists, as we don't know if the module is imported or required.
+			for target in self._export(exports, "./" + subpath if subpath else "."):
+				target = os.path.normpath(os.path.join(path, target))
+				if self._isFile(target):
+					return target
+			return None
+		if subpath:
+			target = os.path.join(path, subpath)
+			return self._loadFile(target) or self._loadDirectory(target)
+		else:
+			return self._loadDirectory(path, meta)
+
+	def _export( self, exports, subpath ):
+		"""Returns the list of targets exported for the given subpath."""
+		if isinstance(exports, dict) and [_ for _ in exports if _.startswith(".")]:
+			if subpath in exports:
+				return self._targets(exports[subpath])
+			for key in exports:
+				if "*" in key:
+					prefix, suffix = key.split("*", 1)
+					if subpath.startswith(prefix) and subpath.endswith(suffix) and len(subpath) >= len(prefix) + len(suffix):
+						value  = subpath[len(prefix):len(subpath) - len(suffix)]
+						return [_.replace("*", value) for _ in self._targets(exports[key])]
+			return []
+		elif subpath == ".":
+			return self._targets(exports)
+		else:
+			return []
+
+	def _targets( self, target, res=None ):
+		"""Returns the list of paths in the given export target, where the
+		conditions are taken in the order of `OPTIONS["conditions"]`, not
+		in the order of the package's map."""
+		res = [] if res is None else res
+		if isinstance(target, str) or isinstance(target, unicode):
+			res.append(target)
+		elif isinstance(target, type([])):
+			for _ in target:
+				self._targets(_, res)
+		elif isinstance(target, dict):
+			for condition in self.options["conditions"]:
+				if condition in target:
+					self._targets(target[condition], res)
+		return res
+
+	def _isFile( self, path ):
+		return self.cache.exists(path) and not self.cache.isdir(path)
+
+	def _loadFile( self, path ):
+		for _ in ("",) + tuple(self.options["extensions"]):
+			if self._isFile(path + _):
+				return path + _
+		return None
+
+	def _loadDirectory( self, path, meta=None ):
+		if meta is None:
+			meta = self.cache.readJSON(os.path.join(path, "package.json")) or {}
+			if not isinstance(meta, dict): meta = {}
+		for field in self.options["fields"]:
+			main = meta.get(field)
+			if main and (isinstance(main, str) or isinstance(main, unicode)):
+				main = os.path.join(path, main)
+				res  = self._loadFile(main) or self._loadIndex(main)
+				if res: return res
+		return self._loadIndex(path)
+
+	def _loadIndex( self, path ):
+		for _ in self.options["index"]:
+			p = os.path.join(path, _)
+			if self._isFile(p):
+				return p
+		return None
 
 # -----------------------------------------------------------------------------
 #
@@ -294,9 +1746,14 @@ class Sugar(LineParser):
 		super(Sugar, self).__init__()
 		self.version = version
 
+	def reset( self ):
+		super(Sugar, self).reset()
+		self.version = 1
+		return self
+
 	def onParse( self, path, type=None ):
+		self.provides = []
 		self.requires = []
-		self.version  = 1
 
 	def onParseEnd( self, path, type=None ):
 		pass
@@ -304,7 +1761,7 @@ class Sugar(LineParser):
 		# 	self.requires.insert(0, (self.type or "sjs:module", "extend"))
 
 	def onModule( self, line, match ):
-		self.provides.append((self.type or "sjs:module",match.group(1)))
+		self.provides.append(Symbol(self.type or "sjs:module",match.group(1)))
 
 	def onSugar2( self, line, match ):
 		self.version = 2
@@ -315,7 +1772,7 @@ class Sugar(LineParser):
 		for _ in line.split(","):
 			_ = _.strip().split()[0]
 			if _:
-				self.requires.append((self.type or "sjs:module",_))
+				self.requires.append(Symbol(self.type or "sjs:module",_))
 
 # -----------------------------------------------------------------------------
 #
@@ -351,6 +1808,22 @@ class Paml(LineParser):
 		self.subparser = None
 		self.subparserIndent = 0
 
+	def reset( self ):
+		self._endSubparser()
+		super(Paml, self).reset()
+		self.subparserIndent = 0
+		return self
+
+	def onParseEnd( self, path, type ):
+		self._endSubparser()
+		super(Paml, self).onParseEnd(path, type)
+
+	def _endSubparser( self ):
+		if self.subparser:
+			self.subparser.onParseEnd(self.path, self.type)
+			self._releaseSubparser(self.subparser)
+		self.subparser = None
+
 	def _getIndentation( self, line ):
 		i = 0
 		while i < len(line) and line[i] == "\t": i += 1
@@ -365,17 +1838,15 @@ class Paml(LineParser):
 			if indent > self.subparserIndent:
 				self.subparser.parseLine(line[indent:])
 			else:
-				self.subparser.onParseEnd(self.path, self.type)
-				self.subparser = None
+				self._endSubparser()
 		if script:
-			if self.subparser:
-				self.subparser.onParseEnd(self.path, self.type)
+			self._endSubparser()
 			indent = len(script.group(1) or "")
 			lang   = script.group(2).split("@")[-1]
 			if lang == "sugar":
-				self.subparser = Sugar()
+				self.subparser = self._subparser(Sugar)
 			else:
-				self.subparser = JavaScript()
+				self.subparser = self._subparser(JavaScript)
 			self.subparser.onParse(self.path, self.type)
 			# We bind the provides/requires
 			self.subparser.provides = self.provides
@@ -411,9 +1882,9 @@ class Paml(LineParser):
 			if "url(" in url:
 				url = url.split("url(", 1)[-1].split(")", 1)[0]
 			if "://" in url:
-				self.requires.append(("css:url",  url))
+				self.requires.append(Symbol("css:url",  url))
 			else:
-				self.requires.append(("css:file", url))
+				self.requires.append(Symbol("css:file", url))
 
 	def onJavaScriptTag( self, line, match ):
 		if "src=" in line:
@@ -421,12 +1892,12 @@ class Paml(LineParser):
 			if src[0] == src[-1] and src[0] in '"\'': src = src[1:-1]
 			# We strip sources with template expressions
 			if "{$" not in src:
-				self.requires.append(("js:file", src))
+				self.requires.append(Symbol("js:file", src))
 
 	def onJavaScriptRequire( self, line, match, type="js:module"):
 		reqs = line.split("(",1)[1].rsplit(")",1)[0].split(",")
 		for name in reqs:
-			self.requires.append((type, name))
+			self.requires.append(Symbol(type, name))
 
 	def onJavaScriptGModule( self, line, match ):
 		return self.onJavaScriptRequire(line, match, type="js:gmodule")
@@ -434,16 +1905,16 @@ class Paml(LineParser):
 	def onImportPragma( self, line, match ):
 		symbol = match.group(1)
 		type   = match.group(3)
-		d = (type + ":module" if type else "*", symbol)
+		d = Symbol(type + ":module" if type else "*", symbol)
 		if d not in self.requires:
 			self.requires.append(d)
 
 	def onJSXImport( self, line, match):
 		p = dict((v.strip() for v in w.split("=")) for w in match.group(1).split(","))
 		if "component" in p:
-			self.requires.append(("js:component", self._unquote(p["component"])))
+			self.requires.append(Symbol("js:component", self._unquote(p["component"])))
 		elif "from" in p:
-			self.requires.append(("js:module", self._unquote(p["from"])))
+			self.requires.append(Symbol("js:module", self._unquote(p["from"])))
 
 	def onCSSRequire( self, line, match ):
 		return self.onJavaScriptRequire(line, match, type="css:module")
@@ -452,7 +1923,7 @@ class Paml(LineParser):
 		component = match.group(1).strip()
 		if component[0] == component[-1] and component[-1] in "'\"":
 			component = component[1:-1]
-		self.requires.append(("js:component", component))
+		self.requires.append(Symbol("js:component", component))
 
 	def onInclude( self, line, match ):
 		line = line[len(match.group()):]
@@ -461,7 +1932,7 @@ class Paml(LineParser):
 		type = "paml:file"
 		if line.endswith(".svg"):
 			type = "*:file"
-		self.requires.append((type, line))
+		self.requires.append(Symbol(type, line))
 
 # -----------------------------------------------------------------------------
 #
@@ -482,13 +1953,13 @@ class CSS(LineParser):
 	def onImport( self, line, match ):
 		path = match.group(1).strip()
 		if path[0] == path[-1] and path[0] in '"\'': path = path[1:-1]
-		self.requires.append(("css:file", self.normpath(path)))
+		self.requires.append(Symbol("css:file", self.normpath(path)))
 
 	def onURL( self, line, match ):
 		url = match.group(1)
 		if url[0] == url[-1] and url[0] in "\"'": url = url[1:-1]
 		if url.startswith("file://"): url = url[7:]
-		self.requires.append(("*", url if "://" in url else self.normpath(url.split("?",1)[0].split("#",1)[0])))
+		self.requires.append(Symbol("*", url if "://" in url else self.normpath(url.split("?",1)[0].split("#",1)[0])))
 
 # -----------------------------------------------------------------------------
 #
@@ -516,11 +1987,11 @@ class PCSS(CSS):
 			return CSS.onURL(self, line, match)
 
 	def onModule( self, line, match ):
-		self.provides.append(("pcss:module",match.group(1)))
+		self.provides.append(Symbol("pcss:module",match.group(1)))
 
 	def onInclude( self, line, match ):
 		path = match.group(1).strip()
-		self.requires.append(("pcss:file", self.normpath(path)))
+		self.requires.append(Symbol("pcss:file", self.normpath(path)))
 
 	def onImport( self, line, match ):
 		path = match.group(2).strip()
@@ -530,9 +2001,9 @@ class PCSS(CSS):
 			if path[0] == path[-1]:
 				path = path[1:-1]
 			# NOTE: We don't want to normalize the path as the URL
-			self.requires.append(("css:file", path))
+			self.requires.append(Symbol("css:file", path))
 		else:
-			self.requires.append(("css:module", path))
+			self.requires.append(Symbol("css:module", path))
 
 # -----------------------------------------------------------------------------
 #
@@ -541,7 +2012,9 @@ class PCSS(CSS):
 # -----------------------------------------------------------------------------
 
 class Block(LineParser):
-	"""Dependency parser for .block files."""
+	"""Dependency parser for .block files. The content of each directive is
+	streamed line by line to the corresponding subparser (like `Paml` does
+	for embedded scripts), so that the file is only scanned once."""
 
 	OPTIONS = {}
 
@@ -552,41 +2025,65 @@ class Block(LineParser):
 
 	def __init__( self ):
 		super(Block, self).__init__()
-		self.blocks   = None
+		self.subparser = None
+
+	def reset( self ):
+		super(Block, self).reset()
+		if self.subparser:
+			self._releaseSubparser(self.subparser)
+		self.subparser = None
+		return self
 
 	def onParse( self, path, type ):
 		super(Block, self).onParse(path, type)
-		self.blocks = []
+		self.subparser = None
 		# All block require the block.xsl.paml file
-		self.requires.append(("*", "block.xsl"))
+		self.requires.append(Symbol("*", "block.xsl"))
 
 	def onParseEnd( self, path, type ):
+		self._endBlock()
 		super(Block, self).onParseEnd(path, type)
-		for name, params, lines in self.blocks:
-			parser = None
+
+	def _startBlock( self, name, params ):
+		"""Creates the subparser for the block with the given name, or directly
+		registers the dependencies for directives that have no content."""
+		parser = None
+		if name == "sugar2":
+			parser = self._subparser(Sugar)
+		elif name == "paml":
+			parser = self._subparser(Paml)
+		elif name == "pcss":
+			parser = self._subparser(PCSS)
+		elif name == "import":
+			self.requires += [Symbol("{0}:file".format(_.rsplit(".",1)[-1]), _.strip()) for _ in params.split(" ") if _.strip()]
+		elif name == "component":
+			# TODO: Strip binding and attributes
+			self.requires += [Symbol("component", _.strip()) for _ in params.split("{",1)[0].strip().split(" ") if _.strip()]
+		# TODO: Texto
+		if parser:
+			parser.onParse(self.path, None)
 			if name == "sugar2":
-				parser = Sugar(version=2)
-			elif name == "paml":
-				parser = Paml()
-			elif name == "pcss":
-				parser = PCSS()
-			elif name == "import":
-				self.requires += [("{0}:file".format(_.rsplit(".",1)[-1]), _.strip()) for _ in params.split(" ") if _.strip()]
-			elif name == "component":
-				# TODO: Strip binding and attributes
-				self.requires += [("component", _.strip()) for _ in params.split("{",1)[0].strip().split(" ") if _.strip()]
-			# TODO: Texto
-			if parser:
-				parser.parse("\n".join(lines), path=path)
-				self.provides += parser.provides
-				self.requires += parser.requires
+				parser.version = 2
+		self.subparser = parser
+
+	def _endBlock( self ):
+		"""Ends the current subparser (if any) and merges its provided and
+		required elements."""
+		parser = self.subparser
+		if parser:
+			parser.onParseEnd(self.path, None)
+			self.provides += parser.provides
+			self.requires += parser.requires
+			self._releaseSubparser(parser)
+		self.subparser = None
 
 	def onDirective( self, line, match ):
-		self.blocks.append([match.group(1), match.group(2), []])
+		self._endBlock()
+		self._startBlock(match.group(1), match.group(2))
 
 	def onContent( self, line, match ):
-		if self.blocks:
-			self.blocks[-1][2].append(line[1:])
+		if self.subparser:
+			self.subparser.parseLine(line[1:].rstrip("\n"))
 
 # -----------------------------------------------------------------------------
 #
@@ -614,18 +2111,22 @@ class Component(LineParser):
 	}
 
 	@classmethod
-	def Resolve( cls, item, path, dirs=(), verbose=False ):
+	def Resolve( cls, item, path, dirs=(), verbose=False, cache=None, options=None ):
 		res     = []
-		dirs    = dirs or cls.OPTIONS["path"]
+		options = options or cls.OPTIONS
+		dirs    = dirs or options["path"]
 		paths   = [_ for _ in dirs] + [os.getcwd()]
 		if path:
-			paths.append(os.path.dirname(os.path.abspath(path)) if not os.path.isdir(path) else os.path.abspath(path))
+			isdir = cache.isdir(path) if cache else os.path.isdir(path)
+			paths.append(os.path.dirname(os.path.abspath(path)) if not isdir else os.path.abspath(path))
 		for parent in set(paths):
-			for sub in cls.OPTIONS["path"]:
+			for sub in options["path"]:
 				d = os.path.join(os.path.join(parent, sub), item[1])
-				for t,f in cls.OPTIONS["files"]:
+				for t,f in options["files"]:
 					p = os.path.join(d, f)
-					if os.path.exists(p):
+					exists = cache.exists(p) if cache else os.path.exists(p)
+					if cache and cache.trace: cache.trace.probe(path=p, exists=exists)
+					if exists:
 						res.append((t,p))
 		return res
 
@@ -633,7 +2134,9 @@ class Component(LineParser):
 		super(Component, self).__init__()
 
 	def resolve( self, item, path, dirs=(), verbose=False ):
-		return self.Resolve(item, path, dirs)
+		res = self.Resolve(item, path, dirs, cache=self.cache, options=self.COMPONENTS)
+		if self.cache and self.cache.trace: self.cache.trace.rule(self._ruleName("component", Component), res)
+		return res
 
 # -----------------------------------------------------------------------------
 #
@@ -642,20 +2145,79 @@ class Component(LineParser):
 # -----------------------------------------------------------------------------
 
 class Tracker(object):
-	"""Extracts and aggregates dependencies."""
+	"""Extracts and aggregates dependencies.
+
+	The recursive traversal uses an explicit work list rather than Python
+	recursion, and can be bounded:
+
+	- `policy` is either `dfs` (the default, which tracks the dependencies in
+	  the order they are declared) or `bfs` (which tracks the closest files
+	  first, so that `maxDepth` and `maxFiles` are exact),
+	- `maxDepth` is the maximum number of dependency edges followed from the
+	  given path,
+	- `maxFiles` is the maximum number of files parsed by the tracker,
+	- `recurse` is a list of type patterns (like `sjs:*`), the dependencies
+	  whose type does not match are resolved but not tracked.
+
+	Trackers are thread-safe: the `parsers` and parser `configuration`
+	(see `LineParser.Configuration`) are immutable snapshots taken when
+	the tracker is created, the caches it shares (`cache`, `misses`,
+	`parsed` and `found`) can be used from many threads, and the methods
+	that update the tracker (`fromPath`, `fromTexts`, `closures`, etc) hold
+	the tracker's `lock`. Concurrent queries should use one tracker each,
+	sharing the caches (see `Workspace.tracker`), as the queries made on
+	the same tracker run one at a time. The generators (`iterPath` and
+	`iterEdges`) don't take the lock and are meant to be consumed by the
+	thread that created them.
+	"""
 
+	# The extensions of the files that are dependencies but have none,
+	# like the JSON files that Node modules can resolve to
 	IGNORES = [
-		"svg"
+		"svg",
+		"json",
 	]
 
-	def __init__( self ):
-		self.PARSERS   = PARSERS
-		self.provides  = []
-		self.requires  = []
-		self.paths     = []
-		self.resolved  = {}
-		self.nodes     = {}
-		self._resolver = None
+	POLICIES = ("dfs", "bfs")
+
+	def __init__( self, cache=None, misses=None, policy="dfs", maxDepth=None, maxFiles=None, recurse=None, parsed=None, found=None, parsers=None, configuration=None ):
+		assert policy in self.POLICIES, "Unsupported traversal policy `{0}`, expected one of {1}".format(policy, self.POLICIES)
+		self.PARSERS    = MappingProxyType(dict(parsers or PARSERS))
+		self.configuration = configuration or LineParser.Configuration()
+		self.lock       = threading.RLock()
+		self.provides   = []
+		self.requires   = []
+		self.paths      = []
+		self.resolved   = {}
+		self.nodes      = {}
+		self.policy     = policy
+		self.maxDepth   = maxDepth
+		self.maxFiles   = maxFiles
+		self.recurse    = recurse
+		# Maps unresolved items to the paths that reference them
+		self.unresolved = {}
+		self.cache      = cache  or DirectoryCache()
+		self.misses     = misses if misses is not None else NegativeCache()
+		# Maps each tracked file to the paths its dependencies resolved to
+		self.dependencies = {}
+		# The `Digests` of the parsed files, if any (see `fingerprint`)
+		self.digests    = None
+		# A cache of parse results with `get(path, type, parser_type)` and
+		# `set(path, type, parser_type, parser)`, if any (see `ParseCache` and `git.BlobCache`)
+		self.parsed     = parsed
+		self._resolver  = None
+		# The parsers are reused from one file to the next
+		self.pool       = ParserPool(self.configuration)
+		# The resolution results (a `ResolutionCache`), which can be shared
+		# between trackers
+		self._found     = found if found is not None else ResolutionCache()
+		# The identities of the visited files (see `DirectoryCache.identity`),
+		# mapped to the path they were first visited with
+		self._visited   = {}
+		self._parsed    = 0
+		# The absolute paths of the in-memory overlays (see `overlay`)
+		self._overlays  = set()
+		self._recursed  = {}
 
 	def fromPath( self, path, recursive=False ):
 		"""Lists the dependencies at the given path in import priority. This
@@ -674,69 +2236,440 @@ class Tracker(object):
 
 		if the file `lib/js/jquery.js+lodash.js` does not exists.
 		"""
-		self._fromPath(path, recursive=recursive)
+		with self.lock:
+			self._fromPath(path, recursive=recursive)
+			return self._results()
+
+	def fromText( self, text, path=None, recursive=False ):
+		"""Like `fromPath`, but the file at the given path has the given
+		text, which does not need to be saved (see `fromTexts`)."""
+		assert path, "Tracker.fromText requires a path, which selects the parser and resolves relative names"
+		return self.fromTexts({path:text}, recursive=recursive)
+
+	def fromTexts( self, texts, recursive=False ):
+		"""Like `fromPath` for all the paths of the given `{path:text}` map,
+		where the texts are in-memory overlays of the files (see `overlay`).
+		The paths are tracked in a single traversal, so that the files
+		they share are only parsed and resolved once."""
+		with self.lock:
+			self.overlay(texts)
+			self._fromPath(tuple(texts.keys()), recursive=recursive)
+			return self._results()
+
+	def overlay( self, texts ):
+		"""Registers the given `{path:text}` map so that the texts are used
+		instead of the files at the given paths, which don't need to exist,
+		both for parsing and resolution. The first overlay gives the
+		tracker its own directory cache, misses and resolution results, so
+		that the overlays don't leak in the caches it shares."""
+		with self.lock:
+			if not isinstance(self.cache.fs, OverlayFileSystem):
+				trace        = self.cache.trace
+				self.cache   = DirectoryCache(validate=self.cache.validate, fs=OverlayFileSystem(self.cache.fs))
+				self.cache.trace = trace
+				self.misses  = NegativeCache()
+				self._found  = ResolutionCache()
+				self._resolver = None
+			fs = self.cache.fs
+			for path, text in texts.items():
+				abspath  = os.path.abspath(path)
+				identity = self.cache.identity(abspath)
+				if abspath not in self._overlays:
+					# The new file might resolve previous misses, and the listings
+					# of its parent directories need to be updated.
+					self.misses.clear()
+					self._found.clear()
+					parent = abspath
+					while parent != os.path.dirname(parent):
+						parent = os.path.dirname(parent)
+						self.cache.invalidate(parent)
+					self._overlays.add(abspath)
+				fs.set(abspath, text)
+				self.cache.invalidate(abspath)
+				# Files are only parsed once, so an overlaid file that was
+				# already tracked needs to be parsed again.
+				self._visited.pop(identity, None)
+				self._visited.pop(self.cache.identity(abspath), None)
+			return self
+
+	def _results( self ):
 		return {
 			"provides":self.provides,
 			"resolved":self.resolved,
+			"unresolved":self.unresolved,
 			"requires":self._sortRequires(self.requires)
 		}
 
 
+	def iterPath( self, path, recursive=True ):
+		"""Like `fromPath`, but yields the `(type, path)` of each tracked
+		file as soon as all of its (recursive) dependencies have been
+		yielded, so that the files come out in a valid load order while the
+		rest of the graph is still being scanned. The given path is
+		yielded last, with a `None` type. Files that are part of a cycle
+		are yielded after the file that closes the cycle is completed."""
+		for _ in self._iterPath(path, recursive=recursive):
+			yield _
+
+	def iterEdges( self, path, recursive=True ):
+		"""Yields a `(source path, dependency type, name, [resolved paths])`
+		record for each dependency as soon as it is resolved. Unlike `fromPath`,
+		this does not register anything in the tracker (`provides`,
+		`requires`, `nodes`, `resolved` and `paths` are left untouched):
+		only the set of visited paths is retained, so that memory stays
+		roughly constant regardless of the size of the graph. The traversal
+		is the same as `fromPath`'s, following the tracker's `policy`,
+		`maxDepth`, `maxFiles` and `recurse` settings."""
+		edges = set()
+		if self.policy == "bfs":
+			return self._iterBreadthFirst(path, recursive, edges=edges)
+		else:
+			return self._iterDepthFirst(path, recursive, edges=edges)
+
 	# NOTE: isDependency is set to True ewhen recursing
 	def _fromPath( self, path, recursive=False, type=None, isDependency=False ):
 		"""Helper function of the `Tracker.fromPath` method. Gets a parser
 		for the given file type, parses the file at the given path and
 		merges the `Parser.provides`/`Parser.requires`.
 		"""
-		if not os.path.exists(path) and "+" in path:
-			# We're given a  '+'-separated list of paths, so we split it
+		for _ in self._iterPath(path, recursive=recursive, type=type, isDependency=isDependency):
+			pass
+		return self
+
+	def _iterPath( self, path, recursive=False, type=None, isDependency=False ):
+		"""Does the actual work of `_fromPath`, yielding `(type, path)` for
+		each tracked file once its dependencies are complete."""
+		if self.policy == "bfs":
+			return self._iterBreadthFirst(path, recursive, type, isDependency)
+		else:
+			return self._iterDepthFirst(path, recursive, type, isDependency)
+
+	def _iterDepthFirst( self, path, recursive=False, type=None, isDependency=False, edges=None ):
+		"""Depth-first traversal, which tracks each dependency as soon as it
+		is resolved. Each frame of the stack is
+		`[path, type, parser, next requirement index, pending, depth, isDependency]`
+		where `pending` lists the `(type, path)` to be tracked next.
+
+		When `edges` is a set (see `iterEdges`), nothing is registered in the
+		tracker: the identities of the visited files are added to `edges`
+		and the edges are yielded instead of the tracked files."""
+		visit = self._visit if edges is None else self._visitEdges(edges)
+		stack = [[None, None, None, 0, [(type, _) for _ in self._roots(path)], -1, isDependency]]
+		while stack:
+			frame = stack[-1]
+			frame_path, frame_type, parser, index, pending, depth, is_dependency = frame
+			if pending:
+				t, p  = pending.pop(0)
+				paths = self._split(p)
+				if paths:
+					frame[4] = [(t, _) for _ in paths] + pending
+					continue
+				res = visit(p, t, is_dependency, depth + 1)
+				if res is True:
+					yield (t, p)
+				elif res:
+					# NOTE: Dependencies of the new frame are always dependencies
+					stack.append([p, t, res, 0, [], depth + 1, True])
+			elif parser and index < len(parser.requires):
+				frame[3] = index + 1
+				dependency = parser.requires[index]
+				if edges is None:
+					resolved = self._resolveDependency(parser, dependency, frame_path)
+				else:
+					resolved = self._resolveEdge(parser, dependency, frame_path)
+					yield (frame_path, dependency[0], dependency[1], [_[1] for _ in resolved])
+				if recursive and (self.maxDepth is None or depth < self.maxDepth):
+					frame[4] = [_ for _ in resolved if self._recurses(_[0])]
+			else:
+				stack.pop()
+				if parser:
+					self.pool.release(parser)
+				if parser and edges is None and self.cache.exists(frame_path):
+					yield (frame_type, frame_path)
+
+	def _iterBreadthFirst( self, path, recursive=False, type=None, isDependency=False, edges=None ):
+		"""Breadth-first traversal, which tracks the files closest to the given
+		path first. The files are yielded in load order once the traversal
+		is complete, while the edges are yielded as soon as they are
+		resolved when `edges` is given (see `_iterDepthFirst`)."""
+		visit   = self._visit if edges is None else self._visitEdges(edges)
+		queue   = deque([(type, _, isDependency, 0) for _ in self._roots(path)])
+		tracked = OrderedDict()
+		while queue:
+			t, p, is_dependency, depth = queue.popleft()
+			paths = self._split(p)
+			if paths:
+				queue.extendleft(reversed([(t, _, is_dependency, depth) for _ in paths]))
+				continue
+			parser = visit(p, t, is_dependency, depth)
+			if not parser:
+				if parser is True: tracked[p] = t
+				continue
+			tracked[p] = t
+			for dependency in parser.requires:
+				if edges is None:
+					resolved = self._resolveDependency(parser, dependency, p)
+				else:
+					resolved = self._resolveEdge(parser, dependency, p)
+					yield (p, dependency[0], dependency[1], [_[1] for _ in resolved])
+				if recursive and (self.maxDepth is None or depth < self.maxDepth):
+					queue.extend((_[0], _[1], True, depth + 1) for _ in resolved if self._recurses(_[0]))
+			self.pool.release(parser)
+		if edges is not None:
+			return
+		order = Closures(self.dependencies).order
+		for p in order:
+			if p in tracked and self.cache.exists(p):
+				yield (tracked[p], p)
+
+	def _roots( self, path ):
+		"""Returns the paths a traversal starts from, as the given path
+		can be a tuple of paths."""
+		return path if isinstance(path, tuple) else (path,)
+
+	def _split( self, path ):
+		"""Returns the list of paths if the given path is a '+'-separated
+		list of paths (see `fromPath`), `None` otherwise."""
+		if "+" in path and not self.cache.exists(path):
 			paths  = path.split("+")
 			prefix = os.path.dirname(paths[0])
-			paths  = [paths[0]] + [os.path.join(prefix, _) for _ in paths[1:]]
-			return [self._fromPath(_, recursive=recursive, item=item) for _ in paths]
-		elif path in self.paths:
-			# We've already scanned that path, so we return as-is
-			return self
-		elif os.path.isdir(path):
+			return [paths[0]] + [os.path.join(prefix, _) for _ in paths[1:]]
+		return None
+
+	def _recurses( self, type ):
+		"""Tells if the dependencies of the given type are to be tracked,
+		according to the `recurse` patterns."""
+		if not self.recurse:
+			return True
+		res = self._recursed.get(type)
+		if res is None:
+			res = self._recursed[type] = bool([_ for _ in self.recurse if fnmatch.fnmatch(type or "*", _)])
+		return res
+
+	def _visit( self, path, type, isDependency, depth=0 ):
+		"""Parses the file at the given path and merges its provided and
+		required elements. Returns the parser, `True` if the file exists but
+		has no parser, or `None` if the file is not to be (or was already)
+		tracked."""
+		if self.cache.isdir(path):
 			# We skip directories
-			pass
+			return None
+		elif self.cache.ignores.rules and self.cache.ignores.ignored(path):
+			# We skip the ignored files, even when given explicitly
+			return None
+		identity = self.cache.identity(path)
+		if identity in self._visited:
+			# We've already scanned that file, maybe through another path,
+			# so we return as-is
+			return None
+		elif self.maxFiles is not None and self._parsed >= self.maxFiles:
+			if self._parsed == self.maxFiles:
+				logging.warning("Reached the maximum number of files ({0}), skipping {1} and following".format(self.maxFiles, path))
+				self._parsed += 1
+			return None
+		# We add the path to prevent infinite recursion
+		self.paths.append(path)
+		self._visited[identity] = path
+		self._parsed += 1
+		# Now we find a parser for the extension
+		ext         = path.rsplit(".",1)[-1].lower()
+		parser_type = self.PARSERS.get(ext)
+		# We return and log an error if there's no matching parser
+		if not parser_type:
+			if ext not in self.IGNORES:
+				logging.error("Parser not defined for type `{0}` in: {1}".format(ext, path))
+			if self.cache.exists(path):
+				self.dependencies.setdefault(path, [])
+				return True
+			return None
+		# We do the parsing, merging back the provided and required elements.
+		parser         = self._parse(parser_type, path, type)
+		if isDependency:
+			# If the currently parsed file was a dependency, then we 
+			# don't merge the provides, but add the provides as dependencies.
+			self._merge(self.requires, parser.provides)
+			# The provided symbols are then resolved to this path
+			for name in parser.provides:
+				self._merge(self.resolved.setdefault(name, []), [(name[0], path)])
 		else:
-			# We add the path to prevent infinite recursion
-			self.paths.append(path)
-			# Now we find a parser for the extension
+			self.provides.append((path, parser.provides))
+		self.requires = self._merge(self.requires, parser.requires)
+		# We register/update the provided nodes
+		for name in parser.provides:
+			if name not in self.nodes: self.nodes[name] = []
+			self.nodes[name] = self._merge(self.nodes[name], parser.requires)
+		self.dependencies.setdefault(path, [])
+		return parser
+
+	def _visitEdges( self, visited ):
+		"""Returns a function like `_visit` that only parses the files,
+		registering their identities in the given `visited` set rather
+		than in the tracker (see `iterEdges`)."""
+		def visit( path, type, isDependency, depth=0 ):
+			if self.cache.isdir(path):
+				return None
+			elif self.cache.ignores.rules and self.cache.ignores.ignored(path):
+				return None
+			identity = self.cache.identity(path)
+			if identity in visited:
+				return None
+			elif self.maxFiles is not None and len(visited) >= self.maxFiles:
+				return None
+			visited.add(identity)
 			ext         = path.rsplit(".",1)[-1].lower()
 			parser_type = self.PARSERS.get(ext)
-			# We return and log an error if there's no matching parser
 			if not parser_type:
 				if ext not in self.IGNORES:
 					logging.error("Parser not defined for type `{0}` in: {1}".format(ext, path))
-				return
-			# We do the parsing, merging back the provided and required elements.
-			parser      = parser_type().parsePath(path, type=type)
-			if isDependency:
-				# If the currently parsed file was a dependency, then we 
-				# don't merge the provides, but add the provides as dependencies.
-				self._merge(self.requires, parser.provides)
-			else:
-				self.provides.append((path, parser.provides))
-			self.requires = self._merge(self.requires, parser.requires)
-			# We register/update the provided nodes
-			for name in parser.provides:
-				if name not in self.nodes: self.nodes[name] = []
-				self.nodes[name] = self._merge(self.nodes[name], parser.requires)
-			# We iterate on the dependency, trying to resolve them
-			for dependency in parser.requires:
-				# We don't resolve URLs (yet)
-				dependency_type = dependency[0]
-				if dependency_type.endswith(":url"):
-					continue
-				resolved = self.resolve(parser, dependency, path)
-				if recursive:
-					# FIXME: Support url
-					# if not resolved and "://" not in dependency[1]:
-					# 	logging.error("Cannot recurse on {0} in {1}: dependency {0} cannot be resolved".format(dependency, path))
-					for dependency_type, dependency_path in resolved:
-						self._fromPath(dependency_path, recursive=recursive, type=dependency_type, isDependency=True)
+				return None
+			return self._parse(parser_type, path, type)
+		return visit
+
+	def _parse( self, parser_type, path, type ):
+		"""Returns a parser of the given type for the file at the given
+		path, restoring its result from the `parsed` cache if possible."""
+		parser         = self._createParser(parser_type)
+		# The parse results of in-memory overlays are not cached
+		parsed         = self.parsed if not (self._overlays and os.path.abspath(path) in self._overlays) else None
+		cached         = parsed.get(path, type, parser_type) if parsed else None
+		if cached:
+			# The content was already parsed, so we only restore the result
+			parser.path, parser.type = path, type
+			parser.provides, parser.requires = cached
+		else:
+			parser.parsePath(path, type=type)
+			if parsed:
+				parsed.set(path, type, parser_type, parser)
+		return parser
+
+	def _createParser( self, parser_type ):
+		"""Returns a parser of the given type from the tracker's `pool`,
+		configured and sharing the tracker's caches."""
+		parser         = self.pool.get(parser_type)
+		parser.cache   = self.cache
+		parser.digests = self.digests
+		return parser
+
+	def _resolveDependency( self, parser, dependency, path ):
+		"""Resolves the given dependency of the file at the given path,
+		registering it in `dependencies`."""
+		# We don't resolve URLs (yet)
+		if dependency[0].endswith(":url"):
+			return ()
+		# FIXME: Support url
+		# if not resolved and "://" not in dependency[1]:
+		# 	logging.error("Cannot recurse on {0} in {1}: dependency {0} cannot be resolved".format(dependency, path))
+		resolved = self.resolve(parser, dependency, path)
+		# The dependencies are registered with the path the files were
+		# first tracked with, so that each file is a single node.
+		self._merge(self.dependencies[path], [self._visited.get(self.cache.identity(_[1]), _[1]) for _ in resolved])
+		return resolved
+
+	def _resolveEdge( self, parser, dependency, path ):
+		"""Like `_resolveDependency`, but without registering anything in
+		the tracker (see `iterEdges`)."""
+		if dependency[0].endswith(":url"):
+			return ()
+		return self._find(parser, dependency, path)
+
+	def closures( self, targets ):
+		"""Recursively tracks the given targets and returns an ordered map
+		of `target → [paths]` where the paths are the target's transitive
+		dependencies in load order, followed by the target itself. The
+		traversal is shared by all the targets and each closure is
+		computed once per strongly connected component (see `Closures`)."""
+		with self.lock:
+			if isinstance(targets, str) or isinstance(targets, unicode): targets = [targets]
+			for _ in targets:
+				self._fromPath(_, recursive=True)
+			closures = Closures(self.dependencies)
+			# A target might have been tracked through another path first
+			return OrderedDict((_, closures.closure(self._visited.get(self.cache.identity(_), _))) for _ in targets)
+
+	def newer( self, output, targets ):
+		"""Returns the first of the given targets or of their transitive
+		inputs that is newer than the given output, or `None` if the output
+		is up to date. The traversal stops as soon as a newer file is found,
+		and the files that were parsed before are restored from the `parsed`
+		cache, if any. A missing output is older than its targets. Only
+		files are compared: the directories some items resolve to (like
+		`lib/js`) change whenever a file is added to them."""
+		with self.lock:
+			if isinstance(targets, str) or isinstance(targets, unicode): targets = [targets]
+			stat  = self.cache.stat(output)
+			mtime = stat.st_mtime_ns if stat else None
+			def is_newer( path ):
+				if self.cache.isdir(path):
+					return False
+				stat = self.cache.stat(path)
+				return bool(stat) and (mtime is None or stat.st_mtime_ns > mtime)
+			# The targets are the most likely to have changed
+			for target in targets:
+				if is_newer(target):
+					return target
+			checked = set()
+			for target in targets:
+				for source, t, n, paths in self.iterEdges(target, recursive=True):
+					for path in paths:
+						identity = self.cache.identity(path)
+						if identity not in checked:
+							checked.add(identity)
+							if is_newer(path):
+								return path
+			return None
+
+	def fingerprint( self, target ):
+		"""Returns a stable digest of the given target's transitive inputs,
+		that is the paths of the files it depends on (relative to the current
+		directory) in load order, along with their content digests.
+
+		The files are tracked with a new tracker that shares this tracker's
+		caches, so the digests of the files this tracker parsed are reused
+		as long as the files did not change."""
+		with self.lock:
+			if self.digests is None:
+				self.digests = Digests(fs=self.cache.fs)
+			tracker = Tracker(cache=self.cache, misses=self.misses, parsed=self.parsed, found=self._found, parsers=self.PARSERS, configuration=self.configuration)
+			tracker.digests = self.digests
+			paths   = []
+			for t, p in tracker.iterPath(target, recursive=True):
+				p = os.path.abspath(p)
+				if p not in paths:
+					paths.append(p)
+			digest  = hashlib.new(Digests.ALGORITHM)
+			for p, d in zip(paths, self.digests.computeAll(paths)):
+				digest.update(os.path.relpath(p).encode("utf8"))
+				digest.update(b"\0")
+				digest.update(d.encode("ascii"))
+				digest.update(b"\n")
+			return digest.hexdigest()
+
+	def getResolver( self ):
+		"""Returns the resolver used by this tracker, which shares the
+		tracker's caches."""
+		with self.lock:
+			if not self._resolver:
+				self._resolver = Resolver(self.PARSERS, cache=self.cache, misses=self.misses, configuration=self.configuration)
+			return self._resolver
+
+	def find( self, elements, path=None ):
+		"""Finds the files corresponding to the given symbols (see
+		`Resolver.find`), sharing the caches of this tracker so that
+		the resolution can be directly followed by a `fromPath`."""
+		return self.getResolver().find(elements, path)
+
+	def resolvedPaths( self, requires=None ):
+		"""Returns the list of absolute file paths that the given required
+		items (the tracker's requires by default) were resolved to during
+		traversal, in the order of the items."""
+		with self.lock:
+			paths = []
+			for item in (self.requires if requires is None else requires):
+				for t, p in self.resolved.get(item) or ():
+					p = os.path.abspath(p)
+					if p not in paths and not self.cache.isdir(p):
+						paths.append(p)
+			return paths
 
 	# FIXME: Architecturally, this is a helper function and should be moved
 	# out of the class if used elsewhere.
@@ -751,46 +2684,205 @@ class Tracker(object):
 	def resolve( self, parser, item, path ):
 		"""Finds the actual path for the given item `(type, name)`, returning
 		a list of the matching (type, paths) (the item might be implemented by more than
-		one file)."""
-		# We resolve with the parser first
-		res = [_ for _ in parser.resolve(item, path)] or ()
-		t, name = item
-		# If we haven't found anything, we use the resolver
-		if not res:
-			if not self._resolver:
-				self._resolver = Resolver(self.PARSERS)
-			r = self._resolver.find([item], path)
-			if name in r:
-				res = r[name]
+		one file). Items that could not be resolved are remembered in
+		`misses` and are not searched for again."""
+		res = self._find(parser, item, path)
 		# NOTE: We hash on the *item* as a symbol might have more than one file
 		if item not in self.resolved:
 			# If the item path exists (but does not have a parser), then
 			# we add it as resolved.
-			self.resolved[item] = [item] if os.path.exists(item[1]) else []
+			self.resolved[item] = [item] if self.cache.exists(item[1]) else []
 		self.resolved[item] = self._merge(self.resolved[item], res)
+		if not self.resolved[item]:
+			self._merge(self.unresolved.setdefault(item, []), [path])
+		return res
+
+	def _find( self, parser, item, path ):
+		"""Helper function of `resolve` that returns the cached resolution
+		of the given item, looking it up if needed, without registering
+		the result in the tracker."""
+		key     = NegativeCache.Key(item, path, cache=self.cache)
+		trace   = self.cache.trace
+		if trace: trace.start(item, path, self.cache)
+		# A single lookup, as the entry could be evicted between a membership
+		# test and a read when the cache is shared between threads
+		res     = self._found.get(key)
+		if res is not None:
+			# The item was already resolved from the same location
+			if trace: trace.note("cached", "found")
+		else:
+			# The result is validated against the directories it was found in
+			with self.cache.recording() as probed:
+				res = self._lookup(parser, item, path, key)
+			if res:
+				self._found.set(key, res, probed)
+		if trace: trace.end(res, self.cache)
+		return res
+
+	def _lookup( self, parser, item, path, key=None ):
+		"""Helper function of `resolve` that does the actual resolution of the
+		given item, without registering the result."""
+		t, name = item
+		key     = key or NegativeCache.Key(item, path, cache=self.cache)
+		res     = ()
+		if key not in self.misses:
+			with self.cache.recording() as probed:
+				# We resolve with the parser first
+				res = [_ for _ in parser.resolve(item, path)] or ()
+				# If we haven't found anything, we use the resolver
+				if not res:
+					r = self.getResolver().find([item], path)
+					if name in r:
+						res = r[name]
+			if not res:
+				self.misses.add(key, probed)
+		elif self.cache.trace:
+			self.cache.trace.note("cached", "miss")
 		return res
 
 	def _sortRequires( self, requires ):
 		"""Sorts the given list of requirements so that the given list is
 		returned in loading order."""
-		loaded = []
+		loaded   = []
+		# NOTE: `present` mirrors `loaded` for fast lookups
+		present  = set()
 		requires = sorted(requires, key=lambda _:len(self.nodes.get(_) or ()))
 		def load(module, loaded=loaded):
-			if module in loaded: return
-			index = len(loaded)
+			# Modules are added to `loaded` while their requirements are
+			# loaded (to break cycles), and moved to the end once they are.
+			# The stack holds `(module, index in loaded, requirements)`.
+			if module in present: return
+			stack = [(module, len(loaded), iter(self.nodes.get(module) or ()))]
 			loaded.append(module)
-			for required in self.nodes.get(module) or ():
-				# NOTE: This is a bug, the modules should not import themselves
-				if required == module: continue
-				load(required, loaded)
-			del loaded[index]
-			if module not in loaded:
-				loaded.append(module)
+			present.add(module)
+			while stack:
+				module, index, requirements = stack[-1]
+				for required in requirements:
+					# NOTE: This is a bug, the modules should not import themselves
+					if required == module or required in present: continue
+					stack.append((required, len(loaded), iter(self.nodes.get(required) or ())))
+					loaded.append(required)
+					present.add(required)
+					break
+				else:
+					stack.pop()
+					del loaded[index]
+					loaded.append(module)
 			return loaded
 		for _ in requires:
 			load(_)
 		return loaded
 
+# -----------------------------------------------------------------------------
+#
+# CLOSURES
+#
+# -----------------------------------------------------------------------------
+
+class Closures(object):
+	"""Computes the transitive closures of the nodes of a dependency graph
+	given as a map of `node → [dependencies]`, like `Tracker.dependencies`.
+
+	The strongly connected components of the graph are computed once (using
+	an iterative version of Tarjan's algorithm), in an order where each
+	component comes after the components it depends on. Each node is then
+	numbered by its position in that order and the closure of each component
+	is a bitset (a Python `int`) over these numbers, computed once and shared
+	by all the components that depend on it. Reading the bits of a closure in
+	ascending order gives its nodes in load order.
+
+	Only the keys of the graph are considered as nodes, dependencies that
+	are not in the graph (for instance directories) are ignored."""
+
+	def __init__( self, graph ):
+		self.graph      = graph
+		self.ids        = {}
+		self.nodes      = []
+		self.edges      = []
+		# The nodes in load order
+		self.order      = []
+		# Maps node id to its component and component to its closure
+		self.components = []
+		self.closures   = []
+		self._index()
+		self._visit(range(len(self.nodes)))
+
+	def _index( self ):
+		for node in self.graph:
+			self.ids[node] = len(self.nodes)
+			self.nodes.append(node)
+		for node in self.nodes:
+			self.edges.append([self.ids[_] for _ in self.graph[node] if _ in self.ids])
+		self.components = [None] * len(self.nodes)
+
+	def _visit( self, roots ):
+		"""Iterative Tarjan traversal from the given node ids."""
+		edges    = self.edges
+		count    = len(self.nodes)
+		index    = [-1]    * count
+		low      = [0]     * count
+		onstack  = [False] * count
+		position = [0]     * count
+		stack    = []
+		counter  = 0
+		for root in roots:
+			if index[root] != -1: continue
+			work = [(root, 0)]
+			while work:
+				v, i = work[-1]
+				if index[v] == -1:
+					index[v] = low[v] = counter
+					counter += 1
+					stack.append(v)
+					onstack[v] = True
+				successors = edges[v]
+				if i < len(successors):
+					work[-1] = (v, i + 1)
+					w = successors[i]
+					if index[w] == -1:
+						work.append((w, 0))
+					elif onstack[w]:
+						low[v] = min(low[v], index[w])
+					continue
+				work.pop()
+				if work:
+					u = work[-1][0]
+					low[u] = min(low[u], low[v])
+				if low[v] == index[v]:
+					# We have a new component, all the components reachable
+					# from it have been numbered already.
+					c       = len(self.closures)
+					members = []
+					while True:
+						w = stack.pop()
+						onstack[w] = False
+						self.components[w] = c
+						position[w] = len(self.order)
+						self.order.append(self.nodes[w])
+						members.append(w)
+						if w == v: break
+					bits = 0
+					for m in members:
+						bits |= 1 << position[m]
+						for w in edges[m]:
+							k = self.components[w]
+							if k != c:
+								bits |= self.closures[k]
+					self.closures.append(bits)
+
+	def closure( self, node ):
+		"""Returns the transitive closure of the given node (including the node
+		itself) in load order."""
+		i = self.ids.get(node)
+		if i is None:
+			return []
+		bits = self.closures[self.components[i]]
+		return [self.order[i] for i, c in enumerate(bin(bits)[:1:-1]) if c == "1"]
+
+	def get( self, nodes ):
+		"""Returns an ordered map of `node → closure` for the given nodes."""
+		return OrderedDict((_, self.closure(_)) for _ in nodes)
+
 # -----------------------------------------------------------------------------
 #
 # RESOLVER
@@ -798,19 +2890,33 @@ class Tracker(object):
 # -----------------------------------------------------------------------------
 
 class Resolver(object):
-	"""Resolves (symbol) names into files."""
+	"""Resolves (symbol) names into files.
 
-	def __init__( self, parsers=None ):
+	Like the `Tracker`, the resolver takes a snapshot of the `parsers`
+	and their `configuration` when created, and `find` can be called
+	from many threads. The `paths` should be added before that."""
+
+	def __init__( self, parsers=None, cache=None, misses=None, configuration=None ):
 		super(Resolver, self).__init__()
-		self.PARSERS = parsers or PARSERS
-		self.paths = []
+		self.PARSERS = MappingProxyType(dict(parsers or PARSERS))
+		self.configuration = configuration or LineParser.Configuration()
+		self.paths   = []
+		self.cache   = cache  or DirectoryCache()
+		self.misses  = misses if misses is not None else NegativeCache()
+		# Resolution does not depend on the parse state, so each parser
+		# type is created once and used by all the calls (and threads).
+		types        = []
+		for _ in self.PARSERS.values():
+			if _ not in types: types.append(_)
+		self.parsers = [(_, _().configure(self.configuration)) for _ in types]
 
 	def addPath( self, path ):
 		self.paths.append(path)
 		return self
 
 	def find( self, elements, path=None ):
-		parsers = [(_, self.PARSERS[_]()) for _ in self.PARSERS]
+		parsers = self.parsers
+		for _, p in parsers: p.cache = self.cache
 		matches = {}
 		path    = path or os.getcwd()
 		if isinstance(elements, str) or isinstance(elements, unicode): elements=[elements]
@@ -818,12 +2924,25 @@ class Resolver(object):
 			element_type = None
 			if isinstance(element, tuple): element_type, element = element
 			if element_type == "*": element_type = None
-			for t,p in parsers:
-				matches.setdefault(element,[])
-				# We ensure an element is not present twice
-				for _ in p.resolve((element_type,element), path, self.paths):
-					if _ not in matches[element]:
-						matches[element].append(_)
+			matches.setdefault(element,[])
+			# We skip the elements that we already failed to resolve
+			key   = NegativeCache.Key((element_type, element), path, self.paths, self.cache)
+			trace = self.cache.trace
+			if key in self.misses:
+				if trace: trace.start((element_type, element), path, self.cache).note("cached", "miss").end((), self.cache)
+				continue
+			found = False
+			if trace: trace.start((element_type, element), path, self.cache)
+			with self.cache.recording() as probed:
+				for t,p in parsers:
+					# We ensure an element is not present twice
+					for _ in p.resolve((element_type,element), path, self.paths):
+						found = True
+						if _ not in matches[element]:
+							matches[element].append(_)
+			if trace: trace.end(matches[element], self.cache)
+			if not found:
+				self.misses.add(key, probed)
 		return matches
 
 # -----------------------------------------------------------------------------
@@ -837,6 +2956,8 @@ PARSERS = {
 	"paml"      : Paml,
 	"sjs"       : Sugar,
 	"js"        : JavaScript,
+	"mjs"       : JavaScript,
+	"cjs"       : JavaScript,
 	"pcss"      : PCSS,
 	"css"       : CSS,
 	"c"         : C,
@@ -847,70 +2968,197 @@ PARSERS = {
 	"component" : Component
 }
 
+# -----------------------------------------------------------------------------
+#
+# WORKSPACE
+#
+# -----------------------------------------------------------------------------
+
+class Workspace(object):
+	"""Owns the caches shared by the trackers and resolvers it creates
+	across calls: the parsed files (a `ParseCache`), the resolution
+	results, the misses (a `NegativeCache`) and the directory listings
+	(a `DirectoryCache`), each holding at most `limit` entries.
+
+	Parsed files are validated against their mtime and size. The caches
+	are validated lazily, so that a query only checks what it uses: each
+	directory listing is checked against its mtime the first time a query
+	lists it (see `DirectoryCache.expire`), and the resolution results and
+	misses are dropped as soon as one of the directories that were probed
+	to resolve them changes. `refresh` checks all the cached data at once.
+
+	The module-level functions (`list`, `find`, `provides`, etc) are
+	wrappers around the default workspace returned by `workspace()`.
+
+	A workspace can be used from many threads: its caches are thread-safe,
+	each query uses its own tracker or resolver, and the `parsers` and
+	parser configuration are snapshots taken when it is created.
+	"""
+
+	def __init__( self, limit=10000, parsers=None ):
+		self.PARSERS = MappingProxyType(dict(parsers or PARSERS))
+		self.configuration = LineParser.Configuration()
+		self.cache   = DirectoryCache(validate=True, limit=limit)
+		self.misses  = NegativeCache(limit=limit, validate=True)
+		self.parsed  = ParseCache(limit)
+		self.found   = ResolutionCache(limit=limit, validate=True)
+
+	def refresh( self ):
+		"""Drops the cached data that is not valid anymore."""
+		if self.cache.refresh():
+			self.found.clear()
+			self.misses.clear()
+		return self
+
+	def clear( self ):
+		"""Drops all the cached data."""
+		self.cache.invalidate()
+		self.misses.clear()
+		self.parsed.clear()
+		self.found.clear()
+		return self
+
+	def tracker( self, **options ):
+		"""Returns a new `Tracker` using this workspace's caches, with the
+		given options (`policy`, `maxDepth`, etc)."""
+		self.cache.expire()
+		return Tracker(cache=self.cache, misses=self.misses, parsed=self.parsed, found=self.found, parsers=self.PARSERS, configuration=self.configuration, **options)
+
+	def resolver( self ):
+		"""Returns a new `Resolver` using this workspace's caches."""
+		self.cache.expire()
+		return Resolver(self.PARSERS, cache=self.cache, misses=self.misses, configuration=self.configuration)
+
+	def parse( self, path ):
+		"""Tries to parse the file at the given path and returns the
+		parser along with its exported data, or `(None, None)` if there
+		is no parser for the file."""
+		parser_type = self.PARSERS.get(path.rsplit(".", 1)[-1])
+		if not parser_type:
+			return None, None
+		self.cache.expire()
+		parser       = parser_type().configure(self.configuration)
+		parser.cache = self.cache
+		cached       = self.parsed.get(path, None, parser_type)
+		if cached:
+			parser.path = path
+			parser.provides, parser.requires = cached
+		else:
+			parser.parsePath(path)
+			self.parsed.set(path, None, parser_type, parser)
+		return parser, parser.export()
+
+	def provides( self, path ):
+		parser, res = self.parse(path)
+		return res["provides"] if res else ()
+
+	def find( self, args ):
+		if isinstance(args, str) or isinstance(args, unicode): args = [args]
+		rsl = self.resolver()
+		res = None
+		for _ in args:
+			r = (rsl.find(_))
+			if not res:
+				res = r
+			else:
+				res.update(r)
+		return res
+
+	def iterload( self, args, recursive=True ):
+		deps = self.tracker()
+		if isinstance(args, str) or isinstance(args, unicode): args = [args]
+		for _ in args:
+			for item in deps.iterPath(_, recursive=recursive):
+				yield item
+
+	def iteredges( self, args, recursive=True ):
+		deps = self.tracker()
+		if isinstance(args, str) or isinstance(args, unicode): args = [args]
+		for _ in args:
+			for edge in deps.iterEdges(_, recursive=recursive):
+				yield edge
+
+	def closures( self, args ):
+		return self.tracker().closures(args)
+
+	def newer( self, output, args ):
+		return self.tracker().newer(output, args)
+
+	def list( self, args, recursive=True, resolve=False ):
+		deps = self.tracker()
+		res  = {}
+		if isinstance(args, str) or isinstance(args, unicode): args = [args]
+		for _ in args:
+			r_symbols = (deps.fromPath(_, recursive=recursive))
+			if not res:
+				res = r_symbols
+			else:
+				res.update(r_symbols)
+		req_symbols = res.get("requires") or ()
+		if not resolve:
+			return req_symbols
+		else:
+			return deps.resolvedPaths(req_symbols)
+
+WORKSPACE      = None
+WORKSPACE_LOCK = threading.Lock()
+
 # -----------------------------------------------------------------------------
 #
 # COMMAND-LINE INTERFACE
 #
 # -----------------------------------------------------------------------------
 
+def workspace():
+	"""Returns the default workspace used by the functions below."""
+	global WORKSPACE
+	with WORKSPACE_LOCK:
+		if WORKSPACE is None:
+			WORKSPACE = Workspace()
+	return WORKSPACE
+
 def parse( path ):
 	"""Tries to parse the file at the given path and return a list of
 	the symbols that it provides as a couple `(type, [provides])`."""
-	ext = path.rsplit(".", 1)[-1]
-	parser = PARSERS.get(ext)
-	if parser:
-		parser = parser()
-		return parser, parser.parsePath(path).export()
-	else:
-		return None, None
+	return workspace().parse(path)
 
 def provides( path ):
 	"""Tries to parse the file at the given path and return a list of
 	the symbols that it provides, if any."""
-	parser, res = parse(path)
-	return res["provides"] if res else ()
+	return workspace().provides(path)
 
 def find( args, recursive=True, resolve=False ):
 	"""Finds/lists the dependencies declared in the given files."""
-	rsl = Resolver()
-	res = None
-	if isinstance(args, str) or isinstance(args, unicode): args = [args]
-	for _ in args:
-		r = (rsl.find(_))
-		if not res:
-			res = r
-		else:
-			res.update(r)
-	return res
+	return workspace().find(args)
+
+def iterload( args, recursive=True ):
+	"""Yields the `(type, path)` of the files required by the given files
+	(and the files themselves) in load order, as soon as each file's
+	dependencies have been tracked. See `Tracker.iterPath`."""
+	return workspace().iterload(args, recursive=recursive)
+
+def iteredges( args, recursive=True ):
+	"""Yields the `(source path, dependency type, name, [resolved paths])`
+	records of the dependencies in the given files, as soon as they are
+	discovered. See `Tracker.iterEdges`."""
+	return workspace().iteredges(args, recursive=recursive)
+
+def closures( args ):
+	"""Returns an ordered map of `path → [paths]` with the transitive
+	dependencies of each given file in load order, computed in one pass.
+	See `Tracker.closures`."""
+	return workspace().closures(args)
+
+def newer( output, args ):
+	"""Returns the first of the given files or of their transitive
+	dependencies that is newer than the given output, or `None` if the
+	output is up to date. See `Tracker.newer`."""
+	return workspace().newer(output, args)
 
 def list( args, recursive=True, resolve=False ):
-	"""Lists all the dependencies listed in the given files."""
-	deps = Tracker()
-	rsl  = Resolver()
-	res  = {}
-	if isinstance(args, str) or isinstance(args, unicode): args = [args]
-	for _ in args:
-		r_symbols = (deps.fromPath(_, recursive=recursive))
-		if not res:
-			res = r_symbols
-		else:
-			res.update(r_symbols)
-	req_symbols = res.get("requires") or ()
-	if not resolve:
-		return req_symbols
-	else:
-		paths = []
-		for sym in req_symbols:
-			sym_name = sym[1]
-			resolved  = rsl.find(sym)
-			for k in resolved:
-				# FIXME: I'm not sure why there is a "*" in there
-				if k == "*":
-					continue
-				for s,p in resolved[k]:
-					if p not in paths:
-						paths.append(p)
-		return paths
-
+	"""Lists all the dependencies listed in the given files. When `resolve`
+	is set, the paths the dependencies were resolved to while tracking
+	are returned instead, in load order."""
+	return workspace().list(args, recursive=recursive, resolve=resolve)
 
 # EOF - vim: ts=4 sw=4 noet
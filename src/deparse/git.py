@@ -0,0 +1,257 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+"""Git-aware parse caching. The `GitIndex` uses the local git
+plumbing (`git ls-files -s` and `git diff --name-only`, no network
+access) to get the blob id of the files of a checkout, and the `BlobCache`
+stores the parsed provides and requires keyed by blob id, so that a file
+whose content was already parsed is not parsed again.
+
+Only parsing is incremental: the changed files narrow down which files
+are re-hashed and re-parsed, but resolution is not persisted, so all the
+edges are resolved again on each run (using the in-memory directory and
+miss caches). Resolution depends on directory listings, `package.json`
+files and untracked files, which the changed files don't account for.
+
+The `GitFileSystem` serves the files of a given revision, so that
+the dependencies can be tracked without checking the revision out.
+
+```
+tracker = Tracker()
+tracker.parsed = BlobCache(GitIndex(since="HEAD~1"))
+tracker.fromPath("page.paml", recursive=True)
+tracker.parsed.save()
+```"""
+
+import os, json, hashlib, subprocess, threading
+from .core import logging, Symbol, VirtualFileSystem
+
+# -----------------------------------------------------------------------------
+#
+# GIT INDEX
+#
+# -----------------------------------------------------------------------------
+
+def git( *args, **kwargs ):
+	"""Runs the given git command in the `cwd` directory, returning its
+	output as a string. Raises an `IOError` with git's message if the
+	command fails, for instance outside of a git repository."""
+	try:
+		process = subprocess.Popen(("git",) + args, cwd=kwargs.get("cwd"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	except OSError as e:
+		raise IOError("Cannot run git: {0}".format(e))
+	output, error = process.communicate()
+	if process.returncode:
+		raise IOError("git {0} failed: {1}".format(args[0], error.decode("utf8", "replace").strip()))
+	return output.decode("utf8")
+
+class GitIndex(object):
+	"""Maps the files of a git working tree to their blob ids. The blob
+	ids listed in the index are only trusted for the files that did not
+	change since the `since` revision nor in the working tree, the
+	blob id of the other files is computed from their content, the same
+	way `git hash-object` does.
+
+	When a `revision` is given, the files are the ones of that revision
+	(see `GitFileSystem`) and their blob ids are the ones of its tree."""
+
+	def __init__( self, since=None, path=".", revision=None ):
+		self.since    = since
+		self.revision = revision
+		self.root     = os.path.abspath(self.git("rev-parse", "--show-toplevel", cwd=path).strip())
+		self.gitdir   = os.path.join(os.path.abspath(path), self.git("rev-parse", "--git-dir", cwd=path).strip())
+		self.blobs    = {}
+		self.changed  = set()
+		self.load()
+
+	def git( self, *args, **kwargs ):
+		"""Runs the given git command, returning its output as a string."""
+		return git(*args, cwd=kwargs.get("cwd") or self.root)
+
+	def load( self ):
+		"""Loads the blob ids from the index and the list of changed files,
+		or from the tree of the revision."""
+		self.blobs   = {}
+		self.changed = set()
+		if self.revision:
+			# The content of a revision does not change
+			for entry in self.git("ls-tree", "-r", "-z", self.revision).split("\0"):
+				if not entry: continue
+				# Entries are like `MODE TYPE BLOB\tPATH`
+				meta, path = entry.split("\t", 1)
+				mode, kind, blob = meta.split()
+				if kind == "blob":
+					self.blobs[path] = blob
+			return self
+		for entry in self.git("ls-files", "-s", "-z").split("\0"):
+			if not entry: continue
+			# Entries are like `MODE BLOB STAGE\tPATH`
+			meta, path = entry.split("\t", 1)
+			self.blobs[path] = meta.split(" ")[1]
+		# Files changed in the working tree don't match their index entry,
+		# and the files changed since the revision need to be re-parsed.
+		diffs = [("diff", "--name-only", "-z")]
+		if self.since:
+			diffs.append(("diff", "--name-only", "-z", self.since, "--"))
+		for args in diffs:
+			self.changed.update(_ for _ in self.git(*args).split("\0") if _)
+		return self
+
+	def relpath( self, path ):
+		"""Returns the path relative to the root of the working tree, or
+		`None` if the path is outside of it."""
+		path = os.path.relpath(os.path.abspath(path), self.root)
+		return None if path.startswith("..") else path.replace(os.sep, "/")
+
+	def blob( self, path ):
+		"""Returns the blob id of the file at the given path, or `None`
+		if it cannot be read."""
+		rel = self.relpath(path)
+		if rel is None:
+			return None
+		elif self.revision:
+			return self.blobs.get(rel)
+		elif rel in self.blobs and rel not in self.changed:
+			return self.blobs[rel]
+		try:
+			with open(path, "rb") as f:
+				data = f.read()
+		except (IOError, OSError):
+			return None
+		blob = hashlib.sha1(b"blob " + str(len(data)).encode("ascii") + b"\0" + data).hexdigest()
+		self.blobs[rel] = blob
+		self.changed.discard(rel)
+		return blob
+
+# -----------------------------------------------------------------------------
+#
+# BLOB CACHE
+#
+# -----------------------------------------------------------------------------
+
+class BlobCache(object):
+	"""Stores the provides and requires of parsed files keyed by blob id,
+	parser and type. This is the `Tracker.parsed` hook: `get` returns
+	the `(provides, requires)` of a file that was already parsed, and
+	`set` registers the result of a parser. The cache is saved as JSON in
+	`deparse/parsed.json` within the git directory by default."""
+
+	VERSION = 1
+
+	def __init__( self, index, path=None ):
+		self.index   = index
+		self.path    = path or os.path.join(index.gitdir, "deparse", "parsed.json")
+		self.entries = {}
+		self.hits    = 0
+		self.misses  = 0
+		if os.path.exists(self.path):
+			self.load(self.path)
+
+	def load( self, path ):
+		try:
+			with open(path) as f:
+				data = json.load(f)
+			if data.get("version") == self.VERSION:
+				self.entries.update(data.get("entries", {}))
+		except (IOError, OSError, ValueError, AttributeError) as e:
+			logging.error("Cannot load parse cache from {0}: {1}".format(path, e))
+		return self
+
+	def save( self, path=None ):
+		path   = path or self.path
+		parent = os.path.dirname(path)
+		if parent and not os.path.exists(parent):
+			os.makedirs(parent)
+		with open(path, "w") as f:
+			json.dump({"version":self.VERSION, "entries":self.entries}, f)
+		logging.info("Parse cache: {0} file(s) reused, {1} parsed".format(self.hits, self.misses))
+		return self
+
+	def key( self, path, type, parser_type ):
+		blob = self.index.blob(path)
+		if not blob:
+			return None
+		# The path is part of the key as parsers may derive names from it
+		return "{0}:{1}:{2}:{3}".format(blob, parser_type.__name__, type or "", self.index.relpath(path))
+
+	def get( self, path, type, parser_type ):
+		"""Returns the `(provides, requires)` of the given file if its
+		content was already parsed, `None` otherwise."""
+		key   = self.key(path, type, parser_type)
+		entry = self.entries.get(key) if key else None
+		if entry is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return (
+			[Symbol.Get(_) for _ in entry[0]],
+			[Symbol.Get(_) for _ in entry[1]],
+		)
+
+	def set( self, path, type, parser_type, parser ):
+		"""Registers the provides and requires of the given parser."""
+		key = self.key(path, type, parser_type)
+		if key:
+			self.entries[key] = (
+				[[t, n] for t, n in parser.provides],
+				[[t, n] for t, n in parser.requires],
+			)
+		return parser
+
+# -----------------------------------------------------------------------------
+#
+# GIT FILESYSTEM
+#
+# -----------------------------------------------------------------------------
+
+class GitFileSystem(VirtualFileSystem):
+	"""A filesystem with the files of the given git revision, rooted at
+	the top of the working tree. The tree is listed with `git ls-tree`
+	and the blobs are read through a single `git cat-file --batch`
+	process, so nothing is extracted or checked out."""
+
+	def __init__( self, revision, path="." ):
+		root = git("rev-parse", "--show-toplevel", cwd=path).strip()
+		super(GitFileSystem, self).__init__(root)
+		self.revision = revision
+		self.process  = None
+		# The `git cat-file` pipe is used by one thread at a time
+		self.lock     = threading.Lock()
+		output = git("ls-tree", "-r", "-l", "-z", revision, cwd=self.root)
+		for entry in output.split("\0"):
+			if not entry: continue
+			# Entries are like `MODE TYPE BLOB SIZE\tPATH`
+			meta, name = entry.split("\t", 1)
+			mode, kind, blob, size = meta.split()
+			if kind == "blob":
+				self.add(name, int(size), blob)
+
+	def load( self, path, blob ):
+		with self.lock:
+			if not self.process:
+				self.process = subprocess.Popen(("git", "cat-file", "--batch"), cwd=self.root, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+			self.process.stdin.write(blob.encode("ascii") + b"\n")
+			self.process.stdin.flush()
+			# The output is `BLOB TYPE SIZE\n` followed by the content and `\n`
+			header = self.process.stdout.readline().split()
+			if len(header) != 3:
+				raise IOError("Cannot read blob {0} for {1}".format(blob, path))
+			data = self.process.stdout.read(int(header[2]))
+			self.process.stdout.read(1)
+			return data
+
+	def close( self ):
+		with self.lock:
+			if self.process:
+				self.process.stdin.close()
+				self.process.wait()
+				self.process = None
+
+# EOF - vim: ts=4 sw=4 noet
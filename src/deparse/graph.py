@@ -6,11 +6,154 @@
 # License           : BSD License
 # -----------------------------------------------------------------------------
 # Creation date     : 2016-12-21
-# Last modification : 2016-12-21
+# Last modification : 2026-10-19
 # -----------------------------------------------------------------------------
 
-import sys, argparse, fnmatch
-from deparse.core import Tracker
+import sys, os, re, argparse, fnmatch
+from deparse.core import Tracker, Symbol, Closures
+
+# -----------------------------------------------------------------------------
+#
+# GRAPH
+#
+# -----------------------------------------------------------------------------
+
+class Graph(object):
+	"""An indexed directed graph of symbols, where nodes are numbered and
+	edges are stored as lists of node ids. Nodes are `declared` when they
+	are keys of the tracker's nodes (as opposed to only being required).
+
+	The aggregation methods (`limit`, `collapse`, `condense` and `reduce`)
+	return new graphs, so that they can be chained to make the graph of a
+	large tracker small enough to be rendered."""
+
+	@classmethod
+	def FromTracker( cls, tracker, matches=None ):
+		"""Creates a graph from the given tracker's nodes, keeping only
+		the symbols for which `matches(symbol)` is true."""
+		graph = cls()
+		for k in tracker.nodes:
+			if matches and not matches(k): continue
+			graph.add(k, declared=True)
+		for k, v in tracker.nodes.items():
+			if matches and not matches(k): continue
+			i = graph.ids[k]
+			for e in v:
+				if matches and not matches(e): continue
+				graph.link(i, graph.add(e))
+		return graph
+
+	def __init__( self ):
+		self.nodes    = []
+		self.ids      = {}
+		self.edges    = []
+		self.declared = []
+
+	def add( self, node, declared=False ):
+		i = self.ids.get(node)
+		if i is None:
+			i = self.ids[node] = len(self.nodes)
+			self.nodes.append(node)
+			self.edges.append([])
+			self.declared.append(declared)
+		elif declared:
+			self.declared[i] = True
+		return i
+
+	def link( self, source, destination ):
+		edges = self.edges[source]
+		if destination not in edges:
+			edges.append(destination)
+		return self
+
+	def roots( self ):
+		"""Returns the ids of the nodes of the root components, that is the
+		strongly connected components with no incoming edges from other
+		components. A cycle that nothing depends on is thus a root, while
+		it has no node without incoming edges."""
+		closures  = Closures(dict((i, self.edges[i]) for i in range(len(self.nodes))))
+		component = [closures.components[closures.ids[i]] for i in range(len(self.nodes))]
+		incoming  = [False] * len(closures.closures)
+		for i, edges in enumerate(self.edges):
+			for j in edges:
+				if component[i] != component[j]:
+					incoming[component[j]] = True
+		return [i for i in range(len(self.nodes)) if not incoming[component[i]]]
+
+	def _map( self, key ):
+		"""Returns a new graph where each node is replaced by `key(id)`,
+		merging the nodes with the same key and dropping self-edges."""
+		graph = Graph()
+		ids   = [graph.add(key(i), self.declared[i]) for i in range(len(self.nodes))]
+		for i, edges in enumerate(self.edges):
+			for j in edges:
+				if ids[i] != ids[j]:
+					graph.link(ids[i], ids[j])
+		return graph
+
+	def limit( self, depth ):
+		"""Returns the subgraph of the nodes that are at most `depth` edges
+		away from the roots."""
+		distance = {}
+		current  = self.roots()
+		for i in current: distance[i] = 0
+		for d in range(depth):
+			following = []
+			for i in current:
+				for j in self.edges[i]:
+					if j not in distance:
+						distance[j] = d + 1
+						following.append(j)
+			current = following
+		graph = Graph()
+		for i in range(len(self.nodes)):
+			if i in distance:
+				graph.add(self.nodes[i], self.declared[i])
+		for i in range(len(self.nodes)):
+			if i in distance:
+				for j in self.edges[i]:
+					if j in distance:
+						graph.link(graph.ids[self.nodes[i]], graph.ids[self.nodes[j]])
+		return graph
+
+	def collapse( self, key ):
+		"""Collapses the nodes with the same `key(node)` into one."""
+		return self._map(lambda i: key(self.nodes[i]))
+
+	def condense( self ):
+		"""Collapses each cycle (strongly connected component) into a single
+		`cycle` node."""
+		closures = Closures(dict((i, self.edges[i]) for i in range(len(self.nodes))))
+		members  = {}
+		for i in range(len(self.nodes)):
+			members.setdefault(closures.components[closures.ids[i]], []).append(i)
+		def key( i ):
+			group = members[closures.components[closures.ids[i]]]
+			if len(group) == 1:
+				return self.nodes[i]
+			else:
+				return Symbol("cycle", "{0}+{1}".format(self.nodes[group[0]][1], len(group) - 1))
+		return self._map(key)
+
+	def reduce( self ):
+		"""Returns the transitive reduction of this graph, where the edges
+		that are implied by other paths are removed. Cycles are condensed
+		first, as the transitive reduction is only defined for acyclic
+		graphs."""
+		graph    = self.condense()
+		closures = Closures(dict((i, graph.edges[i]) for i in range(len(graph.nodes))))
+		position = dict((n, i) for i, n in enumerate(closures.order))
+		def reaches( a, b ):
+			bits = closures.closures[closures.components[closures.ids[a]]]
+			return bool(bits >> position[b] & 1)
+		res = Graph()
+		for i, node in enumerate(graph.nodes):
+			res.add(node, graph.declared[i])
+		for i, edges in enumerate(graph.edges):
+			for j in edges:
+				if not [k for k in edges if k != j and reaches(k, j)]:
+					res.link(i, j)
+		return res
 
 # -----------------------------------------------------------------------------
 #
@@ -19,11 +162,25 @@ from deparse.core import Tracker
 # -----------------------------------------------------------------------------
 
 class Grapher(object):
+	"""Outputs the dependency graph of a tracker. The graph can be made
+	smaller by aggregating it:
+
+	- `depth` only keeps the nodes at most `depth` edges away from the roots,
+	- `collapse` merges the nodes by `type`, `dir` (the directory of the file
+	  they resolve to) or `prefix[:N]` (the first N components of their name),
+	- `condense` merges the cycles into single nodes,
+	- `reduce` removes the edges that are implied by other edges.
+	"""
 
-	def __init__( self, types=None, output=sys.stdout ):
-		self.types  = types
-		self.output = output
-		self.keys   = []
+	def __init__( self, types=None, output=sys.stdout, collapse=None, condense=False, reduce=False, depth=None ):
+		self.types    = types
+		self.output   = output
+		self.keys     = []
+		self.collapse = self.CollapseMode(collapse) if collapse else collapse
+		self.condense = condense
+		self.reduce   = reduce
+		self.depth    = depth
+		self._matched = {}
 
 	def name( self, item ):
 		if isinstance(item, tuple):
@@ -46,28 +203,69 @@ class Grapher(object):
 		nodes = []
 		edges = []
 		self.onStart(tracker)
-		for k,v in tracker.nodes.items():
-			if self.matches(k):
-				nodes.append(k)
-				self.onNode(k)
-				for e in v:
-					if not self.matches(e): continue
-					self.onEdge(k,e)
-					edges.append((k,e))
-				self.onNodeEnd(k)
+		graph = self.aggregate(tracker, Graph.FromTracker(tracker, self.matches))
+		for i, k in enumerate(graph.nodes):
+			if not graph.declared[i]: continue
+			nodes.append(k)
+			self.onNode(k)
+			for j in graph.edges[i]:
+				e = graph.nodes[j]
+				self.onEdge(k,e)
+				edges.append((k,e))
+			self.onNodeEnd(k)
 		self.onEnd(tracker, nodes, edges)
 		return nodes, edges
 
+	def aggregate( self, tracker, graph ):
+		"""Applies the aggregations given at construction to the given
+		graph of the given tracker."""
+		if self.depth is not None:
+			graph = graph.limit(self.depth)
+		if self.collapse:
+			graph = graph.collapse(self.collapseKey(tracker, self.collapse))
+		if self.reduce:
+			graph = graph.reduce()
+		elif self.condense:
+			graph = graph.condense()
+		return graph
+
+	@staticmethod
+	def CollapseMode( collapse ):
+		"""Returns the given collapse mode if it is supported, raising a
+		`ValueError` otherwise, so that invalid modes are reported before
+		anything is traversed or output."""
+		mode, sep, n = collapse.partition(":")
+		if mode not in ("type", "dir", "prefix") or (sep and (mode != "prefix" or not n.isdigit())):
+			raise ValueError("Unsupported collapse mode `{0}`, expected type, dir or prefix[:N]".format(collapse))
+		return collapse
+
+	def collapseKey( self, tracker, collapse ):
+		"""Returns the function that gives the key of a symbol for the
+		given collapse mode."""
+		mode, _, n = self.CollapseMode(collapse).partition(":")
+		if mode == "type":
+			return lambda _: Symbol("type", _[0])
+		elif mode == "dir":
+			def key( symbol ):
+				resolved = tracker.resolved.get(symbol)
+				path     = resolved[0][1] if resolved else symbol[1]
+				return Symbol("dir", os.path.relpath(os.path.dirname(os.path.abspath(path))))
+			return key
+		else:
+			n = int(n or 1)
+			return lambda _: Symbol("prefix", "/".join([_ for _ in re.split("[./]", _[1]) if _][:n]))
+
 	def matches( self, item ):
 		"""Tells if the given `item` matches the
 		`.types` given at construction."""
 		if not self.types:
 			return True
 		if isinstance(item,tuple): item=item[0]
-		for t in self.types:
-			if fnmatch.fnmatch(item, t):
-				return True
-		return False
+		# NOTE: Types are few, so we only match each of them once
+		res = self._matched.get(item)
+		if res is None:
+			res = self._matched[item] = bool([_ for _ in self.types if fnmatch.fnmatch(item, _)])
+		return res
 
 	def onStart( self, tracker ):
 		pass
@@ -163,11 +361,24 @@ def command( args, name=None ):
 			help="The types to be matched, wildcards accepted")
 	# oparser.add_argument("-f", "--format",    type=str,  dest="format",  nargs="+", default=("*",),
 	# 		help="The types to be matched, wildcards accepted")
+	oparser.add_argument("-c", "--collapse",  type=str,  dest="collapse", default=None,
+			help="Collapses the nodes by `type`, `dir` or name `prefix[:N]`")
+	oparser.add_argument("-C", "--condense",  dest="condense", action="store_true", default=False,
+			help="Condenses the cycles into single nodes")
+	oparser.add_argument("-R", "--reduce",    dest="reduce",   action="store_true", default=False,
+			help="Removes the edges implied by other edges (transitive reduction)")
+	oparser.add_argument("-d", "--depth",     type=int,  dest="depth",    default=None,
+			help="Only keeps the nodes up to the given depth from the roots")
 	args     = oparser.parse_args(args=args)
+	if args.collapse:
+		try:
+			Grapher.CollapseMode(args.collapse)
+		except ValueError as e:
+			oparser.error(str(e))
 	# We parse all the dependencies
 	tracker = Tracker()
 	for _ in args.files: tracker.fromPath(_, recursive=True)
-	grapher = PlantUML(args.types)
+	grapher = PlantUML(args.types, collapse=args.collapse, condense=args.condense, reduce=args.reduce, depth=args.depth)
 	grapher.graph(tracker)
 
 # -----------------------------------------------------------------------------
@@ -6,17 +6,19 @@
 # License           : BSD License
 # -----------------------------------------------------------------------------
 # Creation date     : 2016-11-25
-# Last modification : 2019-02-14
+# Last modification : 2026-10-19
 # -----------------------------------------------------------------------------
 
-import sys, os, argparse, fnmatch
-from .core import logging, Tracker, Resolver, find, PARSERS
+import sys, os, json, argparse, fnmatch
+from .core import logging, LineParser, Tracker, Resolver, DirectoryCache, IgnoreRules, ArchiveFileSystem, ResolveTrace, Digests, PARSERS
+from .profiling import Profile
 
-def run( args, recursive=False, mode=Tracker ):
-	"""Extracts the dependencies of the given files."""
+def run( args, recursive=False, mode=Tracker, tracker=None ):
+	"""Extracts the dependencies of the given files. The given `tracker`
+	can be shared between runs so that the resolution results are reused."""
 	if isinstance(args, str): args = [args]
+	tracker = tracker or Tracker()
 	if mode == Tracker:
-		tracker = Tracker()
 		res  = None
 		for _ in args:
 			r = (tracker.fromPath(_, recursive=recursive))
@@ -26,10 +28,20 @@ def run( args, recursive=False, mode=Tracker ):
 				res.update(r)
 		return res
 	elif mode == Resolver:
-		res = find(args)
+		res = None
+		for _ in args:
+			r = tracker.find(_)
+			if not res:
+				res = r
+			else:
+				res.update(r)
 		return res
 
-def process( text, path=None, recursive=True ):
+def process( text, path, recursive=True ):
+	"""Tracks the dependencies of the given text as if it was the content
+	of the file at the given path, which does not need to exist: the path
+	selects the parser and the names are resolved relative to it. Returns
+	the tracker (see `Tracker.fromText`)."""
 	tracker = Tracker()
 	tracker.fromText(text, path=path, recursive=recursive)
 	return tracker
@@ -37,6 +49,10 @@ def process( text, path=None, recursive=True ):
 def command( args, name=None ):
 	"""The command-line interface of this module."""
 	if type(args) not in (type([]), type(())): args = [args]
+	if args and args[0] == "exec":
+		# `deparse exec` runs a command for each file in dependency order
+		from .scheduler import command as schedule
+		return schedule(args[1:], "{0} exec".format(name or "deparse"))
 	oparser = argparse.ArgumentParser(
 		prog        = name or os.path.basename(__file__.split(".")[0]),
 		description = "Lists dependencies from PAML and Sugar files"
@@ -61,20 +77,113 @@ def command( args, name=None ):
 			help="Finds the files corresponding to the given symbols (find mode)")
 	oparser.add_argument("-s", "--separator",      dest="sep",    action="store", default="\t",
 			help="Sets the field separator in output")
+	oparser.add_argument("--fingerprint",     dest="fingerprint", action="store_true", default=False,
+			help="Outputs a digest of the transitive inputs of each given file")
+	oparser.add_argument("--digests",         dest="digests", type=str, default=None,
+			help="A JSON file where file digests are stored and reused across runs")
+	oparser.add_argument("--bfs",             dest="bfs",     action="store_true", default=False,
+			help="Tracks the dependencies breadth-first instead of depth-first")
+	oparser.add_argument("--max-depth",       dest="max_depth", type=int, default=None,
+			help="The maximum number of dependency levels to recurse into")
+	oparser.add_argument("--max-files",       dest="max_files", type=int, default=None,
+			help="The maximum number of files to parse")
+	oparser.add_argument("--max-size",        dest="max_size", type=int, default=None,
+			help="Files larger than this number of bytes are skipped with a warning (0 for no limit, default {0})".format(LineParser.MAX_SIZE))
+	oparser.add_argument("--recurse",         dest="recurse", type=str, action="append", default=None,
+			help="Only recurse into the dependencies of the given type (repeatable), wildcards accepted")
+	oparser.add_argument("--each",            dest="each",    action="store_true", default=False,
+			help="Outputs the transitive dependencies of each given file separately, in load order")
+	oparser.add_argument("--edges-ndjson",    dest="edges",   action="store_true", default=False,
+			help="Outputs each dependency edge as a JSON line as soon as it is discovered")
+	oparser.add_argument("--since",           dest="since",   action="store", default=None,
+			help="Reuses the parse results of the files whose git blob did not change, re-parsing the files changed since the given revision (the edges are still all resolved)")
+	oparser.add_argument("--archive",         dest="archive", action="store", default=None,
+			help="Reads the files from the given tar or zip archive, as if it was extracted in the current directory")
+	oparser.add_argument("--strip",           dest="strip",   type=int, default=0,
+			help="The number of leading directories removed from the archive's paths, like tar's --strip-components")
+	oparser.add_argument("--revision",        dest="revision", action="store", default=None,
+			help="Reads the files from the given git revision instead of the working tree")
+	oparser.add_argument("--trace-resolve",   dest="trace_resolve", action="store", default=None,
+			help="Writes the directories and patterns probed to resolve each item, with the time spent, as JSON to the given file")
+	oparser.add_argument("--exclude",         dest="exclude", type=str, action="append", default=None,
+			help="Ignores the files and directories matching the given gitignore-style pattern (repeatable), in addition to the .deparseignore files")
+	oparser.add_argument("--newer-than",      dest="newer",   action="store", default=None, metavar="OUTPUT",
+			help="Exits with 1 if one of the files or of their transitive dependencies is newer than the given output (printed with -p/-P), 0 otherwise")
+	oparser.add_argument("--profile",         dest="profile", action="store", default=None,
+			help="Writes the cProfile statistics of the run to the given file, and its collapsed stacks (for flamegraphs) to the file with a .folded suffix")
+	oparser.add_argument("--profile-sampling", dest="profile_sampling", action="store_true", default=False,
+			help="Only samples the stacks, with a lower overhead, writing the collapsed stacks to the --profile file")
+	oparser.add_argument("--stream",          dest="stream",  action="store_true", default=False,
+			help="Outputs the files in load order as soon as their dependencies are tracked")
 	# We create the parse and register the options
 	args     = oparser.parse_args(args=args)
+	# Resolution and tracking share the same tracker, so that what is
+	# resolved in the first pass is not resolved again in the second.
+	# The options only apply to this run, the parser classes are left as is
+	configuration = LineParser.Configuration(**({} if args.max_size is None else {"MAX_SIZE":args.max_size}))
+	fs       = None
+	parsed   = None
+	if args.since and args.archive:
+		logging.error("--since cannot be used with --archive, whose files are not in git")
+		return 1
+	try:
+		if args.archive:
+			fs = ArchiveFileSystem(args.archive, strip=args.strip)
+		elif args.revision:
+			from .git import GitFileSystem
+			fs = GitFileSystem(args.revision)
+		if args.since:
+			# Files whose content was already parsed are restored from the
+			# git-aware parse cache instead of being parsed again. The blob
+			# ids are the ones of the files that are read.
+			from .git import GitIndex, BlobCache
+			parsed = BlobCache(GitIndex(since=args.since, revision=args.revision))
+	except (IOError, OSError) as e:
+		logging.error("Cannot read the files: {0}".format(e))
+		if fs:
+			fs.close()
+		return 1
+	tracker  = Tracker(
+		cache    = DirectoryCache(fs=fs, ignores=IgnoreRules(args.exclude or ())),
+		policy   = "bfs" if args.bfs else "dfs",
+		maxDepth = args.max_depth,
+		maxFiles = args.max_files,
+		recurse  = args.recurse,
+		parsed   = parsed,
+		configuration = configuration,
+	)
+	if args.trace_resolve:
+		tracker.cache.trace = ResolveTrace()
+	profile  = Profile(args.profile, sampling=args.profile_sampling) if args.profile else None
+	try:
+		if profile:
+			profile.start()
+		return execute(args, tracker)
+	finally:
+		if profile:
+			profile.stop().save()
+		if tracker.parsed:
+			tracker.parsed.save()
+		if tracker.cache.trace:
+			tracker.cache.trace.save(args.trace_resolve)
+		if fs:
+			fs.close()
+
+def execute( args, tracker ):
+	"""Runs the command described by the parsed `args` using the given
+	tracker."""
 	out      = sys.stdout
 	cwd      = os.getcwd()
 	# === RESOLVER ============================================================
-	# This runs like a first pass, as the resolved elements might be fed
-	# to the dependency tracking, for instance:
+	# The resolution mode is exclusive of the other modes, for instance:
 	#
 	# deparse -fl module
 	# deparse -fr module
 	#
+	# only output the paths the given modules resolve to.
 	if args.find:
 		# We're in resolution mode, so we're trying to locate the given elements
-		res   = run(args.files, recursive=args.recursive, mode=Resolver)
+		res   = run(args.files, recursive=args.recursive, mode=Resolver, tracker=tracker)
 		paths = []
 		for name in args.files:
 			resolved = sorted(set(res.get(name) or ()))
@@ -98,13 +207,72 @@ def command( args, name=None ):
 					out.write(path)
 					out.write(args.sep)
 					out.write(",".join(groups.get(path)))
-					out.write(args.sep)
+					out.write("\n")
 				paths.append(path)
-		if args.list or args.recursive:
-			args.files = paths
+		return
+	# === FINGERPRINT =========================================================
+	if args.fingerprint:
+		tracker.digests = Digests(args.digests, fs=tracker.cache.fs)
+		for _ in args.files:
+			out.write(tracker.fingerprint(_))
+			out.write(args.sep)
+			out.write(_)
+			out.write("\n")
+		if args.digests:
+			tracker.digests.save()
+		return
+	# === NEWER ===============================================================
+	if args.newer:
+		# The traversal stops at the first file newer than the output, which
+		# is the only one output.
+		path = tracker.newer(args.newer, args.files)
+		if path and (args.show_path or args.abs_path):
+			out.write(os.path.abspath(path) if args.abs_path else os.path.relpath(path, cwd))
+			out.write("\n")
+		return 1 if path else 0
+	# === EACH ================================================================
+	if args.each:
+		# The closures of all the files are computed in one pass and output
+		# as `FILE<sep>DEPENDENCY` lines.
+		for target, paths in tracker.closures(args.files).items():
+			for p in paths:
+				out.write(target)
+				out.write(args.sep)
+				out.write(os.path.abspath(p) if args.abs_path else os.path.relpath(p, cwd))
+				out.write("\n")
+		return
+	# === EDGES ===============================================================
+	if args.edges:
+		# We output the edges as they are discovered, without keeping the
+		# graph in memory.
+		for _ in args.files:
+			for source, t, n, paths in tracker.iterEdges(_, recursive=args.recursive):
+				if not [_ for _ in args.types if fnmatch.fnmatch(t, _)]:
+					continue
+				out.write(json.dumps({"source":source, "type":t, "name":n, "resolved":paths}))
+				out.write("\n")
+				out.flush()
+		return
+	# === STREAM ==============================================================
+	if args.stream and (args.recursive or args.list):
+		# We output the files as soon as their dependencies are complete,
+		# so that consumers can start processing the leaves.
+		for _ in args.files:
+			for t, p in tracker.iterPath(_, recursive=args.recursive):
+				t = t or "*"
+				if not [_ for _ in args.types if fnmatch.fnmatch(t, _)]:
+					continue
+				if args.show_path or args.abs_path:
+					out.write(os.path.abspath(p) if args.abs_path else os.path.relpath(p, cwd))
+				else:
+					out.write(t)
+					out.write(args.sep)
+					out.write(p)
+				out.write("\n")
+				out.flush()
 	# === TRACKER =============================================================
 	elif args.recursive or args.list:
-		res = run(args.files, recursive=args.recursive, mode=Tracker)
+		res = run(args.files, recursive=args.recursive, mode=Tracker, tracker=tracker)
 		if not res:
 			logging.error("Command returned empty result")
 		elif "requires" not in res:
@@ -124,7 +292,11 @@ def command( args, name=None ):
 							# TODO: We might want an option to check for URLs
 							item_path = item[1]
 							if not r and "://" not in item_path:
-								logging.error("track:Item {0} unresolved".format(item))
+								referrers = (res.get("unresolved") or {}).get(item)
+								if referrers:
+									logging.error("track:Item {0} unresolved, referenced by {1} file(s)".format(item, len(referrers)))
+								else:
+									logging.error("track:Item {0} unresolved".format(item))
 							for t,p in r:
 								if p not in resolved:
 									resolved.append(p)
@@ -146,6 +318,6 @@ def command( args, name=None ):
 
 if __name__ == "__main__":
 	import sys
-	command(sys.argv[1:])
+	sys.exit(command(sys.argv[1:]))
 
 # EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,143 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+"""Profiling of deparse runs. The `Profile` context manager wraps a run
+in `cProfile` and/or a sampling timer, and writes the samples as collapsed
+stacks (one `frame;frame;frame count` line per stack) that flamegraph
+tools like `flamegraph.pl` or speedscope can read. Method frames are named
+after the class of their instance, so the time spent in each parser and
+handler shows up as `JavaScript.onImport` or `Paml.onLinkTag` rather than
+as the `LineParser` methods they inherit.
+
+```
+with Profile("out.prof"):
+	Tracker().fromPath("page.paml", recursive=True)
+```
+
+writes the `cProfile` statistics to `out.prof` (see `pstats`) and the
+collapsed stacks to `out.prof.folded`."""
+
+import os, sys, time, threading
+from .core import logging
+
+# -----------------------------------------------------------------------------
+#
+# PROFILE
+#
+# -----------------------------------------------------------------------------
+
+class Profile(object):
+	"""Profiles the code run within the context. With `sampling`, only the
+	sampling timer is used, which has a much lower overhead, and the
+	collapsed stacks are written to the given path. Otherwise the code is
+	run under `cProfile`, whose statistics are written to the given path,
+	and the collapsed stacks to the path with a `.folded` suffix. The
+	stacks of all the threads but the sampler's are sampled every
+	`interval` seconds.
+
+	The results are written when the context exits, or can be retrieved
+	with `stats` and `folded` when no path is given."""
+
+	FOLDED   = ".folded"
+	INTERVAL = 0.001
+
+	def __init__( self, path=None, sampling=False, interval=None ):
+		self.path     = path
+		self.sampling = sampling
+		self.interval = interval or self.INTERVAL
+		self.samples  = {}
+		self.profiler = None
+		self.started  = None
+		self.elapsed  = 0
+		self._thread  = None
+		self._stop    = threading.Event()
+
+	def __enter__( self ):
+		return self.start()
+
+	def __exit__( self, type, value, traceback ):
+		self.stop()
+		if self.path:
+			self.save()
+		return False
+
+	def start( self ):
+		self.samples = {}
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._sample, name="deparse-profile")
+		self._thread.daemon = True
+		self._thread.start()
+		if not self.sampling:
+			import cProfile
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		self.started = time.time()
+		return self
+
+	def stop( self ):
+		if self.started is None:
+			return self
+		self.elapsed = time.time() - self.started
+		self.started = None
+		if self.profiler:
+			self.profiler.disable()
+		self._stop.set()
+		self._thread.join()
+		return self
+
+	def stats( self ):
+		"""Returns the `pstats.Stats` of the run, if it used `cProfile`."""
+		if not self.profiler:
+			return None
+		import pstats
+		return pstats.Stats(self.profiler)
+
+	def folded( self ):
+		"""Returns the collapsed stacks as text, the most sampled first."""
+		return "".join("{0} {1}\n".format(k, v) for k, v in sorted(self.samples.items(), key=lambda _:(-_[1], _[0])))
+
+	def save( self, path=None ):
+		path   = path or self.path
+		folded = path if self.sampling else path + self.FOLDED
+		if self.profiler:
+			self.profiler.dump_stats(path)
+		with open(folded, "w") as f:
+			f.write(self.folded())
+		logging.info("Profile: {0} sample(s) over {1:0.3f}s written to {2}".format(sum(self.samples.values()), self.elapsed, folded))
+		return self
+
+	def _sample( self ):
+		"""Collects a sample of the stack of each thread every interval."""
+		ident = threading.current_thread().ident
+		while not self._stop.wait(self.interval):
+			for thread, frame in sys._current_frames().items():
+				if thread == ident:
+					continue
+				stack = []
+				while frame:
+					stack.append(self.FrameName(frame))
+					frame = frame.f_back
+				key = ";".join(reversed(stack))
+				self.samples[key] = self.samples.get(key, 0) + 1
+
+	@staticmethod
+	def FrameName( frame ):
+		"""Returns `Class.method` for the frames of methods, where the class
+		is the instance's, and `module.function` for the other frames."""
+		code = frame.f_code
+		if code.co_argcount and code.co_varnames[0] in ("self", "cls"):
+			value = frame.f_locals.get(code.co_varnames[0])
+			if value is not None:
+				owner = value if isinstance(value, type) else value.__class__
+				return "{0}.{1}".format(owner.__name__, code.co_name)
+		module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+		return "{0}.{1}".format(module, getattr(code, "co_qualname", code.co_name))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,236 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+"""Runs a command for each file of a dependency graph, in parallel and in
+dependency order, which makes the `Tracker` graph a build scheduler:
+
+```
+deparse exec -j 4 --match '*.sjs' --logs build/logs page.paml -- sugar -c {}
+```
+
+compiles each Sugar file required by `page.paml` (transitively) once all
+the files it depends on are compiled, running up to 4 compilers at once.
+The scheduling stops as soon as a command fails."""
+
+import os, sys, heapq, fnmatch, argparse, threading, subprocess
+from collections import OrderedDict
+from .core import logging, Tracker, Closures
+
+# -----------------------------------------------------------------------------
+#
+# SCHEDULER
+#
+# -----------------------------------------------------------------------------
+
+class Scheduler(object):
+	"""Runs the given `command` (a list of arguments, where `{}` is replaced
+	by the path, or appended to it if there is none) for each file of the
+	given `graph`, a map of `path → [dependencies]` like
+	`Tracker.dependencies`. A file's command is started once the commands
+	of all its dependencies have succeeded, with up to `jobs` commands
+	running concurrently. The files that are part of a cycle run one after
+	the other, in load order, and the files that depend on one of them
+	wait for the whole cycle.
+
+	Only the files for which `matches(path)` is true run the command, the
+	others are still part of the graph so that the order is preserved.
+	The output of each command is written to a `.log` file within the
+	`logs` directory (mirroring the file's path), or to stdout when the
+	command completes otherwise.
+
+	Once a command fails, no new command is started and `run` returns
+	after the running ones are completed. The return code of each command
+	is kept in `results`, in the order the commands completed."""
+
+	PLACEHOLDER = "{}"
+
+	@classmethod
+	def FromTracker( cls, tracker, targets, command, **options ):
+		"""Returns a scheduler for the given targets and all their
+		transitive dependencies, as tracked by the given tracker. The
+		targets that are not files are left out of the graph and listed
+		in the scheduler's `missing`."""
+		nodes   = []
+		missing = []
+		for target, paths in tracker.closures(targets).items():
+			if not tracker.cache.exists(target) or tracker.cache.isdir(target):
+				logging.error("exec:Target is not a file: {0}".format(target))
+				missing.append(target)
+				continue
+			nodes += [_ for _ in paths if _ not in nodes]
+		known = set(nodes)
+		graph = OrderedDict((_, [d for d in tracker.dependencies.get(_, ()) if d in known]) for _ in nodes)
+		scheduler = cls(graph, command, **options)
+		scheduler.missing = missing
+		return scheduler
+
+	def __init__( self, graph, command, jobs=None, logs=None, matches=None ):
+		self.graph    = graph
+		self.command  = [_ for _ in command]
+		self.jobs     = jobs or os.cpu_count() or 1
+		self.logs     = logs
+		self.matches  = matches
+		self.results  = OrderedDict()
+		self.failed   = []
+		# The targets that could not be scheduled (see `FromTracker`)
+		self.missing  = []
+		# Command outputs are written one at a time
+		self.lock     = threading.Lock()
+
+	def commandFor( self, path ):
+		"""Returns the command to run for the given path."""
+		if not [_ for _ in self.command if self.PLACEHOLDER in _]:
+			return self.command + [path]
+		return [_.replace(self.PLACEHOLDER, path) for _ in self.command]
+
+	def logFor( self, path ):
+		"""Returns the path of the log file of the given path, if any."""
+		if not self.logs:
+			return None
+		rel = os.path.relpath(os.path.abspath(path))
+		if rel.startswith(os.pardir):
+			rel = os.path.abspath(path).lstrip(os.sep)
+		return os.path.join(self.logs, rel + ".log")
+
+	def run( self ):
+		"""Runs the commands, returning `True` if none of them failed."""
+		from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+		closures   = Closures(self.graph)
+		position   = dict((p, i) for i, p in enumerate(closures.order))
+		component  = lambda _:closures.components[closures.ids[_]]
+		# The files are scheduled by component (the cycles of the graph): a
+		# component starts once all the components it depends on are
+		# completed, and its files run one after the other, in load order.
+		members    = OrderedDict()
+		for path in closures.order:
+			members.setdefault(component(path), []).append(path)
+		waiting    = dict((c, set()) for c in members)
+		dependents = {}
+		for path, dependencies in self.graph.items():
+			c = component(path)
+			for d in (component(_) for _ in dependencies if _ in position):
+				if d != c and d not in waiting[c]:
+					waiting[c].add(d)
+					dependents.setdefault(d, []).append(c)
+		ready   = [(position[m[0]], m[0]) for c, m in members.items() if not waiting[c]]
+		heapq.heapify(ready)
+		def complete( path ):
+			# The given path is the first remaining file of its component
+			c = component(path)
+			members[c].pop(0)
+			if members[c]:
+				heapq.heappush(ready, (position[members[c][0]], members[c][0]))
+				return
+			for _ in dependents.get(c, ()):
+				waiting[_].discard(c)
+				if not waiting[_]:
+					heapq.heappush(ready, (position[members[_][0]], members[_][0]))
+		running = {}
+		self.results = OrderedDict()
+		self.failed  = []
+		with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			while ready or running:
+				while ready and len(running) < self.jobs and not self.failed:
+					i, path = heapq.heappop(ready)
+					if self.matches and not self.matches(path):
+						complete(path)
+					else:
+						running[pool.submit(self._run, path)] = path
+				if not running:
+					break
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					path = running.pop(future)
+					code = future.result()
+					self.results[path] = code
+					if code:
+						self.failed.append(path)
+					else:
+						complete(path)
+		return not self.failed
+
+	def _run( self, path ):
+		"""Runs the command for the given path, returning its exit code."""
+		command = self.commandFor(os.path.relpath(path))
+		try:
+			process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+			output  = process.communicate()[0]
+			code    = process.returncode
+		except OSError as e:
+			output  = "{0}: {1}\n".format(command[0], e).encode("utf8")
+			code    = 127
+		log = self.logFor(path)
+		with self.lock:
+			if log:
+				parent = os.path.dirname(log)
+				if not os.path.exists(parent):
+					os.makedirs(parent)
+				with open(log, "wb") as f:
+					f.write(output)
+			else:
+				out = getattr(sys.stdout, "buffer", sys.stdout)
+				out.write(output)
+				out.flush()
+			if code:
+				logging.error("exec:Command failed with code {0} for {1}{2}".format(code, path, ", see " + log if log else ""))
+			else:
+				logging.info("exec:{0}".format(path))
+		return code
+
+# -----------------------------------------------------------------------------
+#
+# COMMAND-LINE INTERFACE
+#
+# -----------------------------------------------------------------------------
+
+def command( args, name=None ):
+	"""The command-line interface of `deparse exec`, which returns the exit
+	code of the first command that failed, 1 if one of the files does not
+	exist (in which case no command is run), or 0."""
+	if type(args) not in (type([]), type(())): args = [args]
+	oparser = argparse.ArgumentParser(
+		prog        = name or "deparse exec",
+		usage       = "%(prog)s [-h] [-j JOBS] [-m PATTERN] [--logs DIR] FILE... -- COMMAND [ARG...]",
+		description = "Runs the command for each of the given files and their dependencies, a file's command starting once the commands of its dependencies succeeded. `{}` in the command is replaced by the file's path, which is appended otherwise."
+	)
+	oparser.add_argument("files", metavar="FILE", type=str, nargs='+',
+			help='The files to run the command for, along with their dependencies')
+	oparser.add_argument("-j", "--jobs",      dest="jobs",    type=int, default=None,
+			help="The number of commands run concurrently (the number of CPUs by default)")
+	oparser.add_argument("-m", "--match",     dest="match",   type=str, action="append", default=None,
+			help="Only runs the command for the files matching the given pattern (repeatable), wildcards accepted")
+	oparser.add_argument("--logs",            dest="logs",    action="store", default=None,
+			help="Writes the output of each command to a .log file in the given directory instead of stdout")
+	args = [_ for _ in args]
+	if "--" not in args:
+		oparser.error("the command must be given after --")
+	i       = args.index("--")
+	cmd     = args[i+1:]
+	args    = oparser.parse_args(args=args[:i])
+	if not cmd:
+		oparser.error("the command must be given after --")
+	matches = (lambda _:bool([p for p in args.match if fnmatch.fnmatch(os.path.relpath(_), p)])) if args.match else None
+	scheduler = Scheduler.FromTracker(Tracker(), args.files, cmd, jobs=args.jobs, logs=args.logs, matches=matches)
+	if scheduler.missing:
+		return 1
+	elif scheduler.run():
+		return 0
+	return scheduler.results[scheduler.failed[0]] or 1
+
+# -----------------------------------------------------------------------------
+#
+# MAIN
+#
+# -----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	sys.exit(command(sys.argv[1:]))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,406 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+import os, sys, json, shutil, logging, tempfile, threading, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from deparse.core import Symbol, LineParser, ParserPool, Sugar, CSS, JavaScript, Block, NodeModules, Tracker, Resolver, Workspace, FileSystem, DirectoryCache, IgnoreRules, NegativeCache, ResolveTrace, VirtualFileSystem, DictFileSystem
+
+class Workdir(unittest.TestCase):
+	"""Runs each test in a new temporary directory."""
+
+	def setUp( self ):
+		self.cwd  = os.getcwd()
+		self.root = tempfile.mkdtemp()
+		os.chdir(self.root)
+
+	def tearDown( self ):
+		os.chdir(self.cwd)
+		shutil.rmtree(self.root)
+
+	def write( self, path, text="" ):
+		parent = os.path.dirname(path)
+		if parent and not os.path.exists(parent):
+			os.makedirs(parent)
+		with open(path, "w") as f:
+			f.write(text)
+		return path
+
+	def touch( self, path ):
+		"""Moves the mtime of the given path forward, so that the change is
+		seen even on filesystems with a coarse mtime resolution."""
+		stat = os.stat(path)
+		os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+# -----------------------------------------------------------------------------
+#
+# SYMBOLS
+#
+# -----------------------------------------------------------------------------
+
+class TestSymbol(unittest.TestCase):
+
+	def testRegistryIsBounded( self ):
+		limit = Symbol.LIMIT
+		try:
+			Symbol.LIMIT = 2
+			a = Symbol("test", "a")
+			self.assertIs(Symbol("test", "a"), a)
+			Symbol("test", "b")
+			Symbol("test", "c")
+			self.assertLessEqual(len(Symbol.ALL), 2)
+			# Evicted symbols are still equal to their new instances
+			self.assertEqual(Symbol("test", "a"), a)
+			self.assertEqual({a:1}[("test", "a")], 1)
+		finally:
+			Symbol.LIMIT = limit
+
+# -----------------------------------------------------------------------------
+#
+# LONG LINES
+#
+# -----------------------------------------------------------------------------
+
+class TestScanLine(unittest.TestCase):
+	"""Lines longer than `LONG_LINE` are scanned for all their matches."""
+
+	CONFIGURATION = LineParser.Configuration(LONG_LINE=16)
+
+	def parse( self, parser_type, text, path ):
+		return [tuple(_) for _ in parser_type().configure(self.CONFIGURATION).parse(text, path=path).requires]
+
+	def testMinifiedCSSImportsAndURLs( self ):
+		text = '@import "a.css";@import "b.css";' + "".join('.c{{background:url("i{0}.png")}}'.format(i) for i in range(300))
+		requires = self.parse(CSS, text, "style.css")
+		self.assertEqual(requires[:2], [("css:file", "a.css"), ("css:file", "b.css")])
+		self.assertEqual(len(requires), 302)
+
+	def testRequiresInOneDeclaration( self ):
+		requires = self.parse(JavaScript, 'var a=require("a"),b=require("b");var c=require("./c")', "main.js")
+		self.assertEqual(requires, [("js:module", "a"), ("js:module", "b"), ("js:file", "c")])
+
+# -----------------------------------------------------------------------------
+#
+# NODE MODULES
+#
+# -----------------------------------------------------------------------------
+
+class TestNodeModules(Workdir):
+
+	def package( self, exports ):
+		self.write("node_modules/pkg/package.json", json.dumps({"name":"pkg", "exports":exports}))
+		for _ in ("index.mjs", "index.cjs", "data.json"):
+			self.write("node_modules/pkg/" + _)
+
+	def resolve( self, name, options=None ):
+		return [os.path.relpath(p) for t, p in NodeModules(DirectoryCache(), options=options).resolve(name, "main.js")]
+
+	def testConditionsFollowTheConfiguredPriority( self ):
+		self.package({".":{"import":"./index.mjs", "require":"./index.cjs"}})
+		self.assertEqual(self.resolve("pkg"), [os.path.join("node_modules", "pkg", "index.cjs")])
+		options = dict(NodeModules.OPTIONS, conditions=("import", "require"))
+		self.assertEqual(self.resolve("pkg", options), [os.path.join("node_modules", "pkg", "index.mjs")])
+
+	def testNestedConditionsAndSubpaths( self ):
+		self.package({
+			"."       : {"node":{"import":"./index.mjs", "default":"./index.cjs"}},
+			"./data"  : "./data.json",
+			"./lib/*" : {"default":"./*.cjs"},
+		})
+		self.assertEqual(self.resolve("pkg"), [os.path.join("node_modules", "pkg", "index.mjs")])
+		self.assertEqual(self.resolve("pkg/data"), [os.path.join("node_modules", "pkg", "data.json")])
+		self.assertEqual(self.resolve("pkg/lib/index"), [os.path.join("node_modules", "pkg", "index.cjs")])
+		self.assertEqual(self.resolve("pkg/other"), [])
+
+	def testResolvedModulesAreTracked( self ):
+		self.package({".":{"import":"./index.mjs"}, "./data":"./data.json"})
+		self.write("node_modules/pkg/index.mjs", "var data = require(\"pkg/data\");\n")
+		self.write("main.js", "var pkg = require(\"pkg\");\n")
+		tracker = Tracker()
+		with self.assertLogs(level=logging.DEBUG) as logs:
+			logging.getLogger().debug("tracking")
+			tracker.fromPath("main.js", recursive=True)
+		self.assertEqual([_ for _ in logs.output if "ERROR" in _], [])
+		self.assertEqual([os.path.relpath(_) for _ in tracker.paths], ["main.js", os.path.join("node_modules", "pkg", "index.mjs"), os.path.join("node_modules", "pkg", "data.json")])
+
+# -----------------------------------------------------------------------------
+#
+# BLOCK
+#
+# -----------------------------------------------------------------------------
+
+class TestBlock(unittest.TestCase):
+
+	TEXT = (
+		"@title Hello\n"
+		"@sugar2\n"
+		"\t@module docmod\n"
+		"\t@import widgets\n"
+		"@import lib/css/reset.css other.paml\n"
+		"@paml\n"
+		"\t<div\n"
+		"\t\t@require:js(lib/js/extend)\n"
+		"@pcss\n"
+		"\t@module docstyle\n"
+		"\t@import theme\n"
+		"@component button {x}\n"
+	)
+
+	def testStreamsContentToSubparsers( self ):
+		parser = Block()
+		parser.onParse("doc.block", None)
+		lines  = self.TEXT.split("\n")
+		for line in lines[:4]:
+			parser.parseLine(line)
+		# The Sugar block is parsed as its lines are met
+		self.assertEqual([tuple(_) for _ in parser.subparser.requires], [("sjs:module", "widgets")])
+
+	def testOrderIsUnchanged( self ):
+		# The order is the one of the former buffered implementation
+		parser = Block().parse(self.TEXT, path="doc.block")
+		self.assertEqual([tuple(_) for _ in parser.provides], [("sjs:module", "docmod"), ("pcss:module", "docstyle")])
+		self.assertEqual([tuple(_) for _ in parser.requires], [
+			("*",          "block.xsl"),
+			("sjs:module", "widgets"),
+			("css:file",   "lib/css/reset.css"),
+			("paml:file",  "other.paml"),
+			("js:module",  "lib/js/extend"),
+			("css:module", "theme"),
+			("component",  "button"),
+		])
+
+# -----------------------------------------------------------------------------
+#
+# PARSER POOL
+#
+# -----------------------------------------------------------------------------
+
+class TestParserPool(unittest.TestCase):
+
+	def testReleasedParsersAreClean( self ):
+		pool   = ParserPool()
+		parser = pool.get(Sugar).parse("@sugar2\n@module a\n@import b\n", path="a.sjs")
+		provides, requires = parser.provides, parser.requires
+		pool.release(parser)
+		reused = pool.get(Sugar)
+		self.assertIs(reused, parser)
+		self.assertEqual((reused.path, reused.type, reused.version), (None, None, 1))
+		self.assertEqual((reused.provides, reused.requires), ([], []))
+		# The results of the previous parse are left as they were
+		self.assertEqual([tuple(_) for _ in provides], [("sjs:module", "a")])
+		self.assertEqual([tuple(_) for _ in requires], [("sjs:module", "b")])
+		self.assertEqual([tuple(_) for _ in reused.parse("@module c\n", path="c.sjs").provides], [("sjs:module", "c")])
+
+	def testSubparsersAreGivenBack( self ):
+		pool   = ParserPool()
+		parser = pool.get(Block)
+		# The Sugar block is still open when the parser is released
+		parser.onParse("doc.block", None)
+		for line in ("@sugar2", "\t@module docmod"):
+			parser.parseLine(line)
+		pool.release(parser)
+		self.assertEqual(parser.subparser, None)
+		self.assertEqual(parser.provides, [])
+		self.assertEqual(pool.get(Block).parse(TestBlock.TEXT, path="doc.block").provides[0], ("sjs:module", "docmod"))
+		self.assertEqual(pool.created, 4)
+
+# -----------------------------------------------------------------------------
+#
+# FILESYSTEMS
+#
+# -----------------------------------------------------------------------------
+
+class TestVirtualFileSystem(unittest.TestCase):
+
+	def testContentIsTheSourceByDefault( self ):
+		fs = VirtualFileSystem(root="/project").add("lib/a.js", 3, b"a()").add("b.js", 3, "b()")
+		self.assertEqual(fs.read("/project/lib/a.js"), b"a()")
+		self.assertEqual(fs.read("/project/b.js"), b"b()")
+		self.assertEqual(fs.list("/project"), {"lib":"d", "b.js":"f"})
+
+	def testContentIsLoadedWithTheLoader( self ):
+		fs = VirtualFileSystem(root="/project", loader=lambda path, source: (path + ":" + source).encode("utf8"))
+		fs.add("lib/a.js", 0, "blob")
+		self.assertEqual(fs.read("/project/lib/a.js"), b"lib/a.js:blob")
+		self.assertRaises(IOError, fs.read, "/project/lib/b.js")
+
+# -----------------------------------------------------------------------------
+#
+# NEGATIVE CACHE
+#
+# -----------------------------------------------------------------------------
+
+class TestNegativeCache(Workdir):
+
+	def testMissExpiresWhenProbedDirectoryChanges( self ):
+		self.write("lib/sjs/other.sjs", "@module other\n")
+		resolver = Resolver(cache=DirectoryCache(validate=True), misses=NegativeCache(validate=True))
+		self.assertEqual(resolver.find("zzz").get("zzz"), [])
+		self.assertEqual(len(resolver.misses), 1)
+		self.write("lib/sjs/zzz.sjs", "@module zzz\n")
+		self.touch("lib/sjs")
+		found = [p for t, p in resolver.find("zzz").get("zzz")]
+		self.assertIn(os.path.join(self.root, "lib/sjs/zzz.sjs"), found)
+
+	def testKeyUsesTheCacheFileSystem( self ):
+		# The `lib` directory only exists in the virtual filesystem
+		cache = DirectoryCache(fs=DictFileSystem({"lib/a.js":""}))
+		self.assertEqual(NegativeCache.Key(("*", "a"), "lib", cache=cache)[2][-1], os.path.join(self.root, "lib"))
+		self.assertEqual(NegativeCache.Key(("*", "a"), "lib")[2][-1], self.root)
+
+# -----------------------------------------------------------------------------
+#
+# RESOLVE TRACE
+#
+# -----------------------------------------------------------------------------
+
+class TestResolveTrace(Workdir):
+
+	def testDirectoriesAreProbedOnce( self ):
+		self.write("lib/sjs/a.sjs", "@module a\n@import b\n")
+		self.write("lib/sjs/b.sjs", "@module b\n")
+		self.write("main.sjs", "@import a\n")
+		tracker = Tracker()
+		tracker.cache.trace = ResolveTrace()
+		tracker.fromPath("main.sjs", recursive=True)
+		entry  = [_ for _ in tracker.cache.trace.entries if _["name"] == "a"][0]
+		probes = [(_.get("dir"), _.get("pattern")) for _ in entry["probes"]]
+		self.assertEqual(len(probes), len(set(probes)))
+		self.assertEqual(entry["resolved"], [os.path.join(self.root, "lib/sjs/a.sjs")])
+
+# -----------------------------------------------------------------------------
+#
+# IGNORE RULES
+#
+# -----------------------------------------------------------------------------
+
+class TestIgnoreRules(Workdir):
+
+	def testIgnoreFilesOfAllParentsApply( self ):
+		self.write(".deparseignore", "generated/\n")
+		self.write("generated/deep/a.js", "var b = require(\"./b\");\n")
+		self.write("generated/deep/b.js")
+		self.write("src/c.js")
+		tracker = Tracker()
+		tracker.fromPath("generated/deep/a.js", recursive=True)
+		tracker.fromPath("src/c.js", recursive=True)
+		self.assertEqual([os.path.relpath(_) for _ in tracker.paths], [os.path.join("src", "c.js")])
+
+	def testParentsAreListedUpToTheRoot( self ):
+		class Listed(FileSystem):
+			def __init__( self ):
+				self.listed = []
+			def list( self, path ):
+				self.listed.append(path)
+				return super(Listed, self).list(path)
+		self.write(".deparseignore", "*.js\n")
+		self.write("project/lib/css/a.css")
+		self.write("project/main.js")
+		fs    = Listed()
+		cache = DirectoryCache(fs=fs, root="project")
+		self.assertTrue(cache.exists("project/lib/css/a.css"))
+		self.assertFalse(cache.exists("project/lib/tmp/project/lib/css/img/b.png"))
+		self.assertEqual([os.path.relpath(_) for _ in fs.listed], ["project", os.path.join("project", "lib"), os.path.join("project", "lib", "css")])
+		# The ignore file above the root does not apply
+		self.assertTrue(cache.exists("project/main.js"))
+		self.assertFalse(DirectoryCache().exists("project/main.js"))
+
+	def testIgnoreFilesAreLoadedOnceAcrossThreads( self ):
+		self.write(".deparseignore", "generated/\n")
+		rules   = IgnoreRules()
+		results = []
+		threads = [threading.Thread(target=lambda: results.append(rules.register(".deparseignore"))) for _ in range(8)]
+		for _ in threads: _.start()
+		for _ in threads: _.join()
+		self.assertEqual(sorted(results), [False] * 7 + [True])
+		self.assertEqual(rules.paths, [os.path.join(self.root, ".deparseignore")])
+
+# -----------------------------------------------------------------------------
+#
+# TRACKER
+#
+# -----------------------------------------------------------------------------
+
+class TestTracker(Workdir):
+
+	def testNewerIgnoresResolvedDirectories( self ):
+		self.write("lib/css/base.css")
+		self.write("style.css", "@import \"lib/css/base.css\"\n")
+		self.write("build/style.css")
+		self.write("lib/css/other.css")
+		for path, mtime in (("lib/css/base.css", 1), ("style.css", 1), ("build/style.css", 2), ("lib/css", 3)):
+			os.utime(path, (mtime, mtime))
+		# Adding a file changed the mtime of `lib/css`, which the import
+		# also resolves to, but none of the inputs changed.
+		self.assertEqual(Tracker().newer("build/style.css", "style.css"), None)
+		os.utime("lib/css/base.css", (3, 3))
+		self.assertEqual(Tracker().newer("build/style.css", "style.css"), os.path.join(self.root, "lib/css/base.css"))
+
+	def testSymlinkedFilesAreTrackedOnce( self ):
+		self.write("lib/js/b.js", "var c = require(\"./c\");\n")
+		self.write("lib/js/c.js")
+		os.symlink("js", "lib/alias")
+		self.write("a.js", "var b = require(\"./lib/js/b\");\nvar d = require(\"./lib/alias/b\");\n")
+		tracker = Tracker()
+		tracker.fromPath("a.js", recursive=True)
+		self.assertEqual([os.path.relpath(_) for _ in tracker.paths], ["a.js", os.path.join("lib", "js", "b.js"), os.path.join("lib", "js", "c.js")])
+		# The symlinked path depends on the file tracked first
+		self.assertEqual(tracker.closures(["lib/alias/b.js"])["lib/alias/b.js"], [os.path.join(self.root, "lib/js/c.js"), os.path.join(self.root, "lib/js/b.js")])
+
+	def chain( self ):
+		# a → b → c → d, and a → e, where `e` is CSS
+		self.write("a.js", "var b = require(\"./b\");\nvar e = require(\"./e.css\");\n")
+		self.write("b.js", "var c = require(\"./c\");\n")
+		self.write("c.js", "var d = require(\"./d\");\n")
+		self.write("d.js")
+		self.write("e.css", "@import \"f.css\"\n")
+		self.write("f.css")
+
+	def sources( self, tracker, path="a.js" ):
+		return sorted(set(os.path.relpath(_[0]) for _ in tracker.iterEdges(path)))
+
+	def testEdgesFollowTheTraversalBounds( self ):
+		self.chain()
+		self.assertEqual(self.sources(Tracker()), ["a.js", "b.js", "c.js", "e.css"])
+		self.assertEqual(self.sources(Tracker(maxDepth=1)), ["a.js", "b.js", "e.css"])
+		self.assertEqual(self.sources(Tracker(policy="bfs", maxDepth=1)), ["a.js", "b.js", "e.css"])
+		self.assertEqual(self.sources(Tracker(policy="bfs", maxFiles=3)), ["a.js", "b.js", "e.css"])
+		self.assertEqual(self.sources(Tracker(recurse=["css:*"])), ["a.js"])
+		tracker = Tracker(maxDepth=1)
+		self.assertEqual([os.path.relpath(_) for _ in tracker.fromPath("a.js", recursive=True) and tracker.paths], ["a.js", "b.js", "e.css"])
+
+	def testEdgesDoNotRegisterAnything( self ):
+		self.chain()
+		tracker = Tracker()
+		self.assertEqual(len(list(tracker.iterEdges("a.js"))), 5)
+		self.assertEqual((tracker.paths, tracker.nodes, tracker.resolved, tracker.dependencies), ([], {}, {}, {}))
+
+# -----------------------------------------------------------------------------
+#
+# WORKSPACE
+#
+# -----------------------------------------------------------------------------
+
+class TestWorkspace(Workdir):
+
+	def testQueriesSeeChangedDirectoriesWithoutRefresh( self ):
+		self.write("lib/sjs/a.sjs", "@module a\n@import b\n")
+		workspace = Workspace()
+		self.assertEqual(workspace.list("lib/sjs/a.sjs", resolve=True), [])
+		self.write("lib/sjs/b.sjs", "@module b\n")
+		self.touch("lib/sjs")
+		self.assertEqual(workspace.list("lib/sjs/a.sjs", resolve=True), [os.path.join(self.root, "lib/sjs/b.sjs")])
+		os.remove("lib/sjs/b.sjs")
+		self.touch("lib/sjs")
+		self.assertEqual(workspace.list("lib/sjs/a.sjs", resolve=True), [])
+
+if __name__ == "__main__":
+	unittest.main()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,59 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+import os, sys, io, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from deparse.graph import Graph, Grapher, command
+
+def make( nodes, edges ):
+	"""Returns a graph with the given nodes and `(source, destination)`
+	edges between them."""
+	graph = Graph()
+	for _ in nodes: graph.add(_, declared=True)
+	for s, d in edges: graph.link(graph.ids[s], graph.ids[d])
+	return graph
+
+class TestGraph(unittest.TestCase):
+
+	def testRootsOfAnAcyclicGraph( self ):
+		graph = make("abc", (("a", "b"), ("b", "c")))
+		self.assertEqual([graph.nodes[_] for _ in graph.roots()], ["a"])
+
+	def testCyclesCanBeRoots( self ):
+		# `a` and `b` form a cycle that nothing depends on, `d` is
+		# independent and `c` is required by the cycle.
+		graph = make("abcd", (("a", "b"), ("b", "a"), ("b", "c")))
+		self.assertEqual([graph.nodes[_] for _ in graph.roots()], ["a", "b", "d"])
+
+	def testLimitKeepsCycles( self ):
+		graph = make("abcde", (("a", "b"), ("b", "a"), ("b", "c"), ("c", "d"), ("e", "e")))
+		limited = graph.limit(1)
+		self.assertEqual(sorted(limited.nodes), ["a", "b", "c", "e"])
+		self.assertEqual(sorted(graph.limit(0).nodes), ["a", "b", "e"])
+
+class TestGrapher(unittest.TestCase):
+
+	def testInvalidCollapseModeFailsEarly( self ):
+		self.assertRaises(ValueError, Grapher, collapse="bogus")
+		self.assertRaises(ValueError, Grapher, collapse="type:2")
+		self.assertEqual(Grapher(collapse="prefix:2").collapse, "prefix:2")
+		stdout, stderr = sys.stdout, sys.stderr
+		sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+		try:
+			with self.assertRaises(SystemExit):
+				command(["-c", "bogus", "missing.sjs"], name="degraph")
+			self.assertEqual(sys.stdout.getvalue(), "")
+		finally:
+			sys.stdout, sys.stderr = stdout, stderr
+
+if __name__ == "__main__":
+	unittest.main()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,76 @@
+# encoding=utf8 ---------------------------------------------------------------
+# Project           : deparse
+# -----------------------------------------------------------------------------
+# Author            : FFunction
+# License           : BSD License
+# -----------------------------------------------------------------------------
+# Creation date     : 2026-10-19
+# Last modification : 2026-10-19
+# -----------------------------------------------------------------------------
+
+import os, sys, shutil, tempfile, unittest
+from collections import OrderedDict
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from deparse.scheduler import Scheduler, command
+
+# Appends `start PATH` and `end PATH` to the log, sleeping in between for `a`
+COMMAND = """
+import sys, time
+log, path = sys.argv[1:]
+with open(log, "a") as f: f.write("start " + path + "\\n")
+time.sleep(0.5 if path == "a" else 0)
+with open(log, "a") as f: f.write("end " + path + "\\n")
+"""
+
+# -----------------------------------------------------------------------------
+#
+# SCHEDULER
+#
+# -----------------------------------------------------------------------------
+
+class TestScheduler(unittest.TestCase):
+
+	def setUp( self ):
+		self.root = tempfile.mkdtemp()
+		self.log  = os.path.join(self.root, "log")
+
+	def tearDown( self ):
+		shutil.rmtree(self.root)
+
+	def events( self ):
+		with open(self.log) as f:
+			return f.read().split("\n")[:-1]
+
+	def testDependentsWaitForTheWholeCycle( self ):
+		# `a`, `b` and `c` are a cycle, and `d` only depends on `b`
+		graph = OrderedDict((
+			("a", ["c"]),
+			("b", ["a"]),
+			("c", ["b"]),
+			("d", ["b"]),
+		))
+		scheduler = Scheduler(graph, [sys.executable, "-c", COMMAND, self.log], jobs=4, logs=self.root)
+		self.assertTrue(scheduler.run())
+		events = self.events()
+		self.assertEqual(len(events), 8)
+		# The cycle runs one file after the other
+		cycle = [_ for _ in events if not _.endswith(" d")]
+		self.assertEqual([_.split()[0] for _ in cycle], ["start", "end"] * 3)
+		self.assertEqual(events[-2:], ["start d", "end d"])
+
+	def testMissingTargetsFailWithoutRunning( self ):
+		cwd = os.getcwd()
+		os.chdir(self.root)
+		try:
+			with open("a.js", "w") as f: f.write("")
+			self.assertEqual(command(["a.js", "missing.sjs", "--", sys.executable, "-c", COMMAND, self.log]), 1)
+			self.assertFalse(os.path.exists(self.log))
+			self.assertEqual(command(["a.js", "--", sys.executable, "-c", COMMAND, self.log]), 0)
+			self.assertEqual(self.events(), ["start a.js", "end a.js"])
+		finally:
+			os.chdir(cwd)
+
+if __name__ == "__main__":
+	unittest.main()
+
+# EOF - vim: ts=4 sw=4 noet